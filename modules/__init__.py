@@ -1,8 +1,12 @@
-from common import Sublist, Handler, FTPHandler, Opt, \
+from common import Sublist, Handler, FTPHandler, Opt, SpatialRefCache, \
     OGR_GEOM_DEF, OGR_TYPE_DEF, OGR_FIELD_DEF, GDAL_FIELD_DEF, OGR_FIELD_DEF_INV, GDAL_FIELD_DEF_INV
 from vector import Vector
 from logger import Logger
 from distance import Distance, Euclidean
 from samples import Samples
 from timer import Timer
-from raster import Raster
+from raster import Raster, RasterMeta
+from catalog import RasterCatalog
+from index import SpatialIndex
+from table import AttributeTable, AttributeRecord
+from geometry import GeometryStore
@@ -0,0 +1,301 @@
+import sqlite3
+import json
+import os
+import re
+from common import *
+from raster import Raster, RasterMeta
+
+
+__all__ = ['RasterCatalog']
+
+
+class RasterCatalog(object):
+    """
+    Persistent catalog of raster files backed by a SQLite database with an R-tree footprint index.
+    Raster metadata is read once per file and only re-read when the file changes on disk.
+    """
+
+    months = ['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+              'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+    year_pattern = re.compile(r'(?<![0-9])((?:19|20)[0-9]{2})(?![0-9])')
+    month_pattern = re.compile(r'(?<![a-z])(' + '|'.join(months) + r')(?![a-z])')
+
+    def __init__(self,
+                 dbfile,
+                 verbose=False):
+        """
+        Constructor for class RasterCatalog
+        :param dbfile: SQLite database file for the catalog (created if it does not exist)
+        :param verbose: If the steps should be displayed
+        """
+        self.dbfile = dbfile
+        self.verbose = verbose
+
+        if self.dbfile != ':memory:' and os.path.dirname(self.dbfile) != '':
+            Handler(self.dbfile).dir_create()
+
+        self.conn = sqlite3.connect(self.dbfile)
+        self.create_tables()
+
+    def __repr__(self):
+        return "<RasterCatalog {} with {} raster(s)>".format(Handler(self.dbfile).basename,
+                                                            str(len(self)))
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM rasters').fetchone()[0]
+
+    def create_tables(self):
+        """
+        Method to create the catalog tables if they do not exist
+        :return: None
+        """
+        self.conn.execute('CREATE TABLE IF NOT EXISTS rasters ('
+                          'id INTEGER PRIMARY KEY, '
+                          'path TEXT UNIQUE, '
+                          'mtime REAL, '
+                          'bands INTEGER, '
+                          'rows INTEGER, '
+                          'cols INTEGER, '
+                          'dtype INTEGER, '
+                          'transform TEXT, '
+                          'crs TEXT, '
+                          'xres REAL, '
+                          'yres REAL, '
+                          'nodata REAL, '
+                          'block_size TEXT, '
+                          'bnames TEXT, '
+                          'year INTEGER, '
+                          'month INTEGER)')
+
+        self.conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS footprints '
+                          'USING rtree(id, xmin, xmax, ymin, ymax)')
+
+        self.conn.execute('CREATE INDEX IF NOT EXISTS rasters_time ON rasters (year, month)')
+        self.conn.commit()
+
+    def close(self):
+        """
+        Method to close the catalog database connection
+        :return: None
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def parse_time(filename):
+        """
+        Method to parse year and month tags from a file name
+        e.g. p070r015_TC_2000.tif -> (2000, None), y2001_jan_precip_data_img.tif -> (2001, 1)
+        :param filename: File name or path
+        :return: Tuple of (year, month), None for tags not found
+        """
+        basename = Handler(filename).basename.lower()
+
+        year_match = RasterCatalog.year_pattern.search(basename)
+        month_match = RasterCatalog.month_pattern.search(basename)
+
+        year = int(year_match.group(1)) if year_match is not None else None
+        month = RasterCatalog.months.index(month_match.group(1)) + 1 if month_match is not None else None
+
+        return year, month
+
+    def add(self,
+            filename,
+            commit=True):
+        """
+        Method to add or update a raster file in the catalog
+        :param filename: Raster file name with full path
+        :param commit: If the transaction should be committed after adding the file
+        :return: True if the file was (re)read, False if the catalog entry was current
+        """
+        path = os.path.abspath(filename)
+        mtime = os.path.getmtime(path)
+
+        row = self.conn.execute('SELECT id, mtime FROM rasters WHERE path = ?', (path,)).fetchone()
+
+        if row is not None and row[1] == mtime:
+            return False
+
+        meta = RasterMeta.from_file(path)
+        year, month = self.parse_time(path)
+
+        values = (path,
+                  mtime,
+                  meta.shape[0],
+                  meta.shape[1],
+                  meta.shape[2],
+                  meta.dtype,
+                  json.dumps(list(meta.transform)),
+                  meta.crs_string,
+                  abs(meta.transform[1]),
+                  abs(meta.transform[5]),
+                  meta.nodatavalue,
+                  json.dumps(list(meta.block_size)) if meta.block_size is not None else None,
+                  json.dumps(list(meta.bnames)),
+                  year,
+                  month)
+
+        if row is not None:
+            raster_id = row[0]
+            self.conn.execute('UPDATE rasters SET path=?, mtime=?, bands=?, rows=?, cols=?, dtype=?, '
+                              'transform=?, crs=?, xres=?, yres=?, nodata=?, block_size=?, bnames=?, '
+                              'year=?, month=? WHERE id = ?', values + (raster_id,))
+            self.conn.execute('DELETE FROM footprints WHERE id = ?', (raster_id,))
+        else:
+            raster_id = self.conn.execute('INSERT INTO rasters (path, mtime, bands, rows, cols, dtype, '
+                                          'transform, crs, xres, yres, nodata, block_size, bnames, '
+                                          'year, month) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                          values).lastrowid
+
+        self.conn.execute('INSERT INTO footprints (id, xmin, xmax, ymin, ymax) VALUES (?, ?, ?, ?, ?)',
+                          (raster_id,) + tuple(meta.bounds))
+
+        if commit:
+            self.conn.commit()
+
+        return True
+
+    def remove(self,
+               filename,
+               commit=True):
+        """
+        Method to remove a raster file from the catalog
+        :param filename: Raster file name with full path
+        :param commit: If the transaction should be committed after removing the file
+        :return: None
+        """
+        path = os.path.abspath(filename)
+        row = self.conn.execute('SELECT id FROM rasters WHERE path = ?', (path,)).fetchone()
+
+        if row is not None:
+            self.conn.execute('DELETE FROM footprints WHERE id = ?', (row[0],))
+            self.conn.execute('DELETE FROM rasters WHERE id = ?', (row[0],))
+
+            if commit:
+                self.conn.commit()
+
+    def scan(self,
+             dirname,
+             pattern='.tif',
+             remove_missing=True):
+        """
+        Method to (re)scan a directory tree for raster files. Only new or modified files are opened.
+        :param dirname: Folder to scan
+        :param pattern: Pattern to look for in the file names (default: '.tif')
+        :param remove_missing: If catalog entries for files under dirname that no longer exist on disk
+                               should be removed
+        :return: Tuple of (number of files added or updated, number of files removed)
+        """
+        filenames = Handler(dirname=dirname).find_all(pattern)
+
+        n_updated = 0
+        for filename in filenames:
+            try:
+                if self.add(filename, commit=False):
+                    n_updated += 1
+                    if self.verbose:
+                        Opt.cprint('Cataloged: {}'.format(filename))
+            except (RuntimeError, ValueError, OSError) as e:
+                Opt.cprint('Unable to catalog {}: {}'.format(filename, e))
+
+        n_removed = 0
+        if remove_missing:
+            root = os.path.join(os.path.abspath(dirname), '')
+
+            # exact, case-sensitive prefix match (LIKE is case-insensitive and uses _ and % as wildcards)
+            for path, in self.conn.execute('SELECT path FROM rasters WHERE substr(path, 1, ?) = ?',
+                                           (len(root), root)).fetchall():
+                if not os.path.isfile(path):
+                    self.remove(path, commit=False)
+                    n_removed += 1
+
+        self.conn.commit()
+
+        if self.verbose:
+            Opt.cprint('Catalog scan of {}: {} updated, {} removed'.format(dirname,
+                                                                           str(n_updated),
+                                                                           str(n_removed)))
+
+        return n_updated, n_removed
+
+    def query(self,
+              bounds=None,
+              year=None,
+              month=None,
+              band=None,
+              crs_string=None):
+        """
+        Method to query the catalog. No raster files are opened.
+        :param bounds: Bounding box (xmin, xmax, ymin, ymax) in the raster CRS to intersect with
+        :param year: Year or (start year, end year) tuple, inclusive
+        :param month: Month number (1-12) or list of month numbers
+        :param band: Band name that the rasters must contain
+        :param crs_string: WKT string of the spatial reference the rasters must have
+        :return: List of Raster objects with metadata filled from the catalog
+        """
+        sql = 'SELECT r.path, r.mtime, r.bands, r.rows, r.cols, r.dtype, r.transform, r.crs, ' \
+              'r.nodata, r.block_size, r.bnames FROM rasters r'
+        conditions = list()
+        params = list()
+
+        if bounds is not None:
+            sql += ' JOIN footprints f ON f.id = r.id'
+            conditions.append('f.xmin <= ? AND f.xmax >= ? AND f.ymin <= ? AND f.ymax >= ?')
+            params += [bounds[1], bounds[0], bounds[3], bounds[2]]
+
+        if year is not None:
+            if type(year) in (list, tuple):
+                conditions.append('r.year BETWEEN ? AND ?')
+                params += [int(year[0]), int(year[1])]
+            else:
+                conditions.append('r.year = ?')
+                params.append(int(year))
+
+        if month is not None:
+            if type(month) not in (list, tuple):
+                month = [month]
+            conditions.append('r.month IN ({})'.format(', '.join('?' for _ in month)))
+            params += list(int(elem) for elem in month)
+
+        if crs_string is not None:
+            conditions.append('r.crs = ?')
+            params.append(crs_string)
+
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        sql += ' ORDER BY r.path'
+
+        rasters = list()
+        for row in self.conn.execute(sql, params):
+            path, mtime, bands, rows, cols, dtype, transform, crs, nodata, block_size, bnames = row
+            bnames = json.loads(bnames)
+
+            if band is not None and band not in bnames:
+                continue
+
+            meta = RasterMeta(name=path,
+                              mtime=mtime,
+                              shape=(bands, rows, cols),
+                              dtype=dtype,
+                              transform=json.loads(transform),
+                              crs_string=crs,
+                              block_size=json.loads(block_size) if block_size is not None else None,
+                              nodatavalue=nodata,
+                              bnames=bnames)
+
+            raster = Raster(path,
+                            bnames=list(meta.bnames),
+                            metadict=meta.metadict,
+                            dtype=meta.dtype,
+                            shape=list(meta.shape),
+                            transform=meta.transform,
+                            crs_string=meta.crs_string)
+            raster.meta = meta
+            raster.nodatavalue = meta.nodatavalue
+
+            rasters.append(raster)
+
+        return rasters
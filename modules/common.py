@@ -1,14 +1,16 @@
 from decimal import *
-from osgeo import ogr, gdal
+from osgeo import ogr, gdal, osr
 from itertools import takewhile, repeat
 import numpy as np
 import datetime
 import fnmatch
+import re
 import random
 import psutil
 import ftplib
 import copy
 import gzip
+import threading
 import sys
 import os
 
@@ -16,6 +18,7 @@ __all__ = ['Sublist',
            'Handler',
            'FTPHandler',
            'Opt',
+           'SpatialRefCache',
            'OGR_FIELD_DEF',
            'OGR_FIELD_DEF_INV',
            'OGR_GEOM_DEF',
@@ -25,7 +28,9 @@ __all__ = ['Sublist',
 
 OGR_FIELD_DEF = {
     'int': ogr.OFTInteger,
-    'long': ogr.OFTInteger,
+    'long': ogr.OFTInteger64,
+    'uint32': ogr.OFTInteger64,
+    'int64': ogr.OFTInteger64,
     'float': ogr.OFTReal,
     'double': ogr.OFTReal,
     'str': ogr.OFTString,
@@ -588,6 +593,10 @@ class Handler(object):
     Class to handle file and folder operations
     """
 
+    int_pattern = re.compile(r'^[+-]?[0-9]+$')
+    float_pattern = re.compile(r'^[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?$|'
+                               r'^[+-]?(?:nan|inf|infinity)$', re.IGNORECASE)
+
     def __init__(self,
                  filename=None,
                  basename=None,
@@ -1090,16 +1099,23 @@ class Handler(object):
         names = list(elem.strip() for elem in lines[0])
 
         if len(lines) > 0:
+            # convert whole columns at once, with the same result as string_to_type on each value
+            rows = lines[1:]
+            lengths = list(len(row) for row in rows)
+            ncols = max(lengths) if len(rows) > 0 else 0
+
+            columns = list(self.convert_values(list(row[j] if j < len(row) else '' for row in rows))
+                           for j in range(ncols))
+            rows = list(list(row)[:length] for row, length in zip(zip(*columns), lengths))
+
             # convert to list
             if return_dicts:
                 if verbose:
                     sys.stdout.write('Converting to Dictionaries...\n')
-                return list(dict(zip(names, list(self.string_to_type(elem) for elem in feat)))
-                            for feat in lines[1:])
+                return list(dict(zip(names, feat)) for feat in rows)
             else:
                 return {
-                    'feature': list(list(self.string_to_type(elem) for elem in feat)
-                                    for feat in lines[1:]),
+                    'feature': rows,
                     'name': names,
                 }
         else:
@@ -1192,25 +1208,165 @@ class Handler(object):
     @staticmethod
     def string_to_type(x):
         """
-        Method to return name of the data type
+        Method to convert a string to int or float if it represents one
         :param x: input item
-        :return: string
+        :return: int, float, or the input item
         """
         if type(x).__name__ == 'str':
             x = x.strip()
             try:
-                val = int(x)
+                return int(x)
             except ValueError:
                 try:
-                    val = float(x)
+                    return float(x)
                 except ValueError:
-                    try:
-                        val = str(x)
-                    except:
-                        val = None
-            x = val
+                    return x
         return x
 
+    @staticmethod
+    def convert_values(values,
+                       sample_size=1000):
+        """
+        Method to convert a column of strings to int, float or str values, with the same result
+        as string_to_type on each value. The column type is inferred from a sample and the
+        column is converted in bulk; only values the bulk conversion cannot decide are
+        converted one at a time (e.g. int values in a float column, numbers in a text column).
+        :param values: List of strings
+        :param sample_size: Number of values used to infer the column type
+        :return: List of int, float or str values
+        """
+        out = list(value.strip() if type(value).__name__ == 'str' else value for value in values)
+
+        if len(out) == 0:
+            return out
+
+        arr = np.array(out, dtype=np.str_)
+        index = np.nonzero(arr != '')[0]
+        nonempty = arr[index]
+
+        col_type = Handler.infer_type(nonempty.tolist(), sample_size)
+
+        if col_type == 'int':
+            try:
+                converted = nonempty.astype(np.int64).tolist()
+            except (ValueError, OverflowError):
+                col_type = 'float'
+            else:
+                for i, value in zip(index.tolist(), converted):
+                    out[i] = value
+                return out
+
+        if col_type == 'float':
+            try:
+                converted = nonempty.astype(np.float64).tolist()
+            except ValueError:
+                pass
+            else:
+                for i, value in zip(index.tolist(), converted):
+                    out[i] = value
+
+                # values that are whole numbers are int, as in string_to_type
+                digits = np.nonzero(np.char.isdigit(np.char.lstrip(nonempty, '+-')))[0]
+                for k in digits.tolist():
+                    out[index[k]] = Handler.string_to_type(str(nonempty[k]))
+                return out
+
+        # text column: only values starting like a number are converted
+        first = nonempty.astype('<U1')
+        maybe_number = np.nonzero(np.isin(first, np.array(list('0123456789+-.nNiI'))))[0]
+        for k in maybe_number.tolist():
+            out[index[k]] = Handler.string_to_type(str(nonempty[k]))
+
+        return out
+
+    @staticmethod
+    def infer_type(values,
+                   sample_size=1000):
+        """
+        Method to infer the type of a column of strings from a sample of its non-empty values
+        :param values: List of strings
+        :param sample_size: Number of non-empty values to test (default: 1000)
+        :return: 'int', 'float' or 'str'
+        """
+        sample = list()
+        for value in values:
+            if value != '':
+                sample.append(value)
+                if len(sample) == sample_size:
+                    break
+
+        if len(sample) == 0:
+            return 'str'
+
+        if all(Handler.int_pattern.match(value) for value in sample):
+            return 'int'
+        elif all(Handler.float_pattern.match(value) for value in sample):
+            return 'float'
+        return 'str'
+
+    @staticmethod
+    def convert_column(values,
+                       col_type=None,
+                       sample_size=1000):
+        """
+        Method to convert a column of strings to a typed numpy array in bulk.
+        Empty values in numeric columns become NaN (integer columns with empty values become float).
+        If a value outside the sample does not fit the inferred type, the next wider type is used.
+        :param values: List of strings
+        :param col_type: 'int', 'float' or 'str' (default: inferred with infer_type)
+        :param sample_size: Number of values used to infer the type
+        :return: Numpy array
+        """
+        if col_type is None:
+            col_type = Handler.infer_type(values, sample_size)
+
+        arr = np.array(values, dtype=np.str_)
+        empty = arr == ''
+
+        if col_type == 'int' and not empty.any():
+            try:
+                return arr.astype(np.int64)
+            except (ValueError, OverflowError):
+                col_type = 'float'
+
+        if col_type in ('int', 'float'):
+            try:
+                return np.where(empty, 'nan', arr).astype(np.float64)
+            except ValueError:
+                pass
+
+        return arr
+
+    def read_csv_columns(self,
+                         columns=None,
+                         delimiter=',',
+                         sample_size=1000):
+        """
+        Method to read a csv file with a header into typed numpy arrays, one per column
+        :param columns: List of column names to keep (default: all columns)
+        :param delimiter: Delimiter (default: ',')
+        :param sample_size: Number of values used to infer each column type
+        :return: Tuple of (list of column names, list of numpy arrays)
+        """
+        with open(self.filename, 'r') as fileptr:
+            names = list(elem.strip() for elem in fileptr.readline().split(delimiter))
+
+            if columns is None:
+                columns = names
+
+            col_index = list(names.index(name) for name in columns)
+            values = list(list() for _ in columns)
+
+            for line in fileptr:
+                if line.strip() == '':
+                    continue
+                elems = line.rstrip('\r\n').split(delimiter)
+                for k, j in enumerate(col_index):
+                    values[k].append(elems[j].strip() if j < len(elems) else '')
+
+        return list(columns), list(self.convert_column(column_values, sample_size=sample_size)
+                                   for column_values in values)
+
 
 class Opt:
     """
@@ -1367,3 +1523,132 @@ class FTPHandler(Handler):
                 except Exception:
                     Opt.cprint('File {} not found or already written'.format(self.basename))
 
+
+class SpatialRefCache(object):
+    """
+    Per-thread cache of OSR spatial references and coordinate transformations,
+    keyed by normalized CRS definitions. OSR objects are not thread-safe, so the cache
+    is held in thread-local storage and each thread builds and reuses its own instances;
+    nothing is shared between threads. Cached objects should not be modified.
+
+    Axis order is explicit: by default spatial references use the traditional GIS order
+    (x = longitude/easting, y = latitude/northing) on GDAL 3+, as the rest of this package expects.
+    """
+
+    _local = threading.local()
+
+    @staticmethod
+    def normalize(crs,
+                  crs_type=None):
+        """
+        Method to get a hashable key for a CRS definition
+        :param crs: EPSG code, WKT string, PROJ4 string, 'EPSG:<code>' string, or OSR spatial reference
+        :param crs_type: 'epsg', 'wkt' or 'proj4' (default: detect from crs)
+        :return: Tuple of (crs type, definition)
+        """
+        if isinstance(crs, osr.SpatialReference):
+            return 'wkt', crs.ExportToWkt()
+
+        if crs_type is None:
+            if type(crs).__name__ in ('int', 'long'):
+                crs_type = 'epsg'
+            elif crs.strip().upper().startswith('EPSG:'):
+                crs_type, crs = 'epsg', crs.strip()[5:]
+            elif crs.strip().startswith('+'):
+                crs_type = 'proj4'
+            else:
+                crs_type = 'wkt'
+
+        if crs_type == 'epsg':
+            return crs_type, int(crs)
+
+        return crs_type, crs.strip()
+
+    @classmethod
+    def _cache(cls):
+        cache = getattr(cls._local, 'cache', None)
+        if cache is None:
+            cache = cls._local.cache = dict()
+        return cache
+
+    @classmethod
+    def get_spref(cls,
+                  crs,
+                  crs_type=None,
+                  traditional_order=True):
+        """
+        Method to get a (cached) OSR spatial reference
+        :param crs: EPSG code, WKT string, PROJ4 string, 'EPSG:<code>' string, or OSR spatial reference
+        :param crs_type: 'epsg', 'wkt' or 'proj4' (default: detect from crs)
+        :param traditional_order: If the traditional GIS axis order (x, y) should be used
+        :return: OSR spatial reference
+        """
+        crs_key = cls.normalize(crs, crs_type)
+        key = ('spref', crs_key, traditional_order)
+        cache = cls._cache()
+
+        spref = cache.get(key)
+
+        if spref is None:
+            spref = osr.SpatialReference()
+
+            if crs_key[0] == 'epsg':
+                res = spref.ImportFromEPSG(crs_key[1])
+            elif crs_key[0] == 'proj4':
+                res = spref.ImportFromProj4(crs_key[1])
+            elif crs_key[0] == 'wkt':
+                res = spref.ImportFromWkt(crs_key[1])
+            else:
+                raise ValueError("Unsupported spatial reference type: {}".format(crs_key[0]))
+
+            if res != 0:
+                raise ValueError("Unable to read spatial reference: {}".format(str(crs_key[1])))
+
+            if traditional_order and hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+                spref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+            cache[key] = spref
+
+        return spref
+
+    @classmethod
+    def get_transform(cls,
+                      source,
+                      target,
+                      source_type=None,
+                      target_type=None,
+                      traditional_order=True):
+        """
+        Method to get a (cached) OSR coordinate transformation between two CRS
+        :param source: Source CRS (see get_spref)
+        :param target: Target CRS (see get_spref)
+        :param source_type: 'epsg', 'wkt' or 'proj4' (default: detect from source)
+        :param target_type: 'epsg', 'wkt' or 'proj4' (default: detect from target)
+        :param traditional_order: If the traditional GIS axis order (x, y) should be used
+        :return: OSR coordinate transformation
+        """
+        source_key = cls.normalize(source, source_type)
+        target_key = cls.normalize(target, target_type)
+        key = ('transform', source_key, target_key, traditional_order)
+        cache = cls._cache()
+
+        transform_tool = cache.get(key)
+
+        if transform_tool is None:
+            transform_tool = osr.CoordinateTransformation(cls.get_spref(source_key[1],
+                                                                        source_key[0],
+                                                                        traditional_order),
+                                                          cls.get_spref(target_key[1],
+                                                                        target_key[0],
+                                                                        traditional_order))
+            cache[key] = transform_tool
+
+        return transform_tool
+
+    @classmethod
+    def clear(cls):
+        """
+        Method to clear the cache of the calling thread
+        :return: None
+        """
+        cls._local.cache = dict()
@@ -0,0 +1,175 @@
+from osgeo import ogr
+from array import array
+import numpy as np
+import os
+
+
+__all__ = ['GeometryStore']
+
+# 64 bit offsets where the array module supports them
+try:
+    OFFSET_TYPECODE = 'q'
+    array(OFFSET_TYPECODE)
+except ValueError:
+    OFFSET_TYPECODE = 'l'
+
+
+class GeometryStore(object):
+    """
+    Compact geometry storage: the WKB bytes of all geometries are kept in one
+    contiguous buffer, with an offsets array marking where each geometry starts.
+    Geometries and WKT strings are only created when requested.
+    """
+
+    def __init__(self,
+                 geoms=None):
+        """
+        Constructor for class GeometryStore
+        :param geoms: Iterable of OGR geometries to store (optional)
+        """
+        self.buffer = bytearray()
+        self.offsets = array(OFFSET_TYPECODE, [0])
+
+        if geoms is not None:
+            self.extend(geoms)
+
+    def __repr__(self):
+        return "<GeometryStore with {} geometries in {} bytes>".format(str(len(self)),
+                                                                      str(len(self.buffer)))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """
+        Get an OGR geometry created from its stored WKB
+        :param index: Geometry index
+        :return: OGR geometry (or None if an empty geometry was stored)
+        """
+        wkb = self.wkb(index)
+        if len(wkb) == 0:
+            return
+        return ogr.CreateGeometryFromWkb(wkb)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self,
+               geom):
+        """
+        Add a geometry to the store
+        :param geom: OGR geometry, WKB bytes, or None
+        :return: None
+        """
+        if geom is not None:
+            if isinstance(geom, (bytes, bytearray)):
+                self.buffer.extend(geom)
+            else:
+                self.buffer.extend(geom.ExportToWkb())
+        self.offsets.append(len(self.buffer))
+
+    def extend(self,
+               geoms):
+        """
+        Add geometries to the store
+        :param geoms: Iterable of OGR geometries or WKB bytes
+        :return: None
+        """
+        for geom in geoms:
+            self.append(geom)
+
+    def wkb(self,
+            index):
+        """
+        Get the WKB bytes of a geometry
+        :param index: Geometry index
+        :return: bytes
+        """
+        if index < 0:
+            index += len(self)
+        return bytes(self.buffer[self.offsets[index]:self.offsets[index + 1]])
+
+    def wkt(self,
+            index):
+        """
+        Get the WKT string of a geometry
+        :param index: Geometry index
+        :return: WKT string
+        """
+        geom = self[index]
+        if geom is not None:
+            return geom.ExportToWkt()
+
+    def wkt_list(self):
+        """
+        Get WKT strings of all geometries
+        :return: List of WKT strings
+        """
+        return list(self.wkt(index) for index in range(len(self)))
+
+    @classmethod
+    def from_wkt(cls,
+                 wkt_list):
+        """
+        Method to create a geometry store from a list of WKT strings
+        :param wkt_list: List of WKT strings
+        :return: GeometryStore object
+        """
+        return cls(ogr.CreateGeometryFromWkt(wkt) if wkt is not None else None
+                   for wkt in wkt_list)
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes used by the WKB buffer and the offsets
+        """
+        return len(self.buffer) + len(self.offsets) * self.offsets.itemsize
+
+    def save(self,
+             filename,
+             **meta):
+        """
+        Method to save the store to a .npz file
+        :param filename: Output file name
+        :param meta: Key word arguments with scalar metadata to store with the geometries
+                     (e.g. source file modification time)
+        :return: None
+        """
+        with open(filename, 'wb') as fileptr:
+            np.savez(fileptr,
+                     wkb=np.frombuffer(bytes(self.buffer), dtype=np.uint8),
+                     offsets=np.array(self.offsets, dtype=np.int64),
+                     meta_keys=np.array(list(meta), dtype=str),
+                     meta_values=np.array(list(meta[k] for k in meta), dtype=np.float64))
+
+    @classmethod
+    def from_file(cls,
+                  filename,
+                  **meta):
+        """
+        Method to load a store saved with save() only if its stored metadata matches the given metadata
+        :param filename: File name
+        :param meta: Key word arguments with scalar metadata that must match
+        :return: GeometryStore object or None if the file is missing or out of date
+        """
+        if not os.path.isfile(filename):
+            return
+
+        try:
+            with np.load(filename, allow_pickle=False) as data:
+                file_meta = dict(zip(data['meta_keys'].tolist(),
+                                     data['meta_values'].tolist()))
+
+                for key, value in meta.items():
+                    if key not in file_meta or file_meta[key] != float(value):
+                        return
+
+                store = cls()
+                store.buffer = bytearray(data['wkb'].tobytes())
+                store.offsets = array(OFFSET_TYPECODE, data['offsets'].tolist())
+
+        except (IOError, OSError, ValueError, KeyError):
+            return
+
+        return store
@@ -0,0 +1,292 @@
+import numpy as np
+import os
+from common import *
+
+
+__all__ = ['SpatialIndex']
+
+
+class SpatialIndex(object):
+    """
+    Sort-Tile-Recursive (STR) packed bounding box index.
+    Item bounding boxes are packed into leaves of nearby items, and leaves are grouped
+    into upper levels of nodes until one level has at most node_size nodes. Queries
+    descend the levels from the top, pruning by node bounding boxes and then by item
+    bounding boxes, all with NumPy.
+    Bounding boxes use the OGR envelope order (xmin, xmax, ymin, ymax).
+    """
+
+    def __init__(self,
+                 bounds=None,
+                 node_size=16):
+        """
+        Constructor for class SpatialIndex
+        :param bounds: Array-like of shape (n, 4) with item bounding boxes (xmin, xmax, ymin, ymax)
+        :param node_size: Number of items per leaf and child nodes per node (default: 16)
+        """
+        self.node_size = node_size
+        self.nitems = 0
+        self.bounds = np.zeros((0, 4), dtype=np.float64)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.leaf_bounds = np.zeros((0, 4), dtype=np.float64)
+        self.levels = list()
+        self.meta = dict()
+
+        if bounds is not None:
+            self.build(bounds)
+
+    def __repr__(self):
+        return "<SpatialIndex with {} item(s) in {} leaves and {} upper level(s)>".format(
+            str(self.nitems), str(self.leaf_bounds.shape[0]), str(len(self.levels)))
+
+    def __len__(self):
+        return self.nitems
+
+    def build(self,
+              bounds):
+        """
+        Method to build the STR packed index
+        :param bounds: Array-like of shape (n, 4) with item bounding boxes (xmin, xmax, ymin, ymax)
+        :return: None
+        """
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+
+        self.bounds = bounds
+        self.nitems = bounds.shape[0]
+
+        if self.nitems == 0:
+            self.order = np.zeros(0, dtype=np.int64)
+            self.leaf_bounds = np.zeros((0, 4), dtype=np.float64)
+            self.levels = list()
+            return
+
+        nleaves = int(np.ceil(self.nitems / float(self.node_size)))
+        nslices = int(np.ceil(np.sqrt(nleaves)))
+        slice_size = nslices * self.node_size
+
+        xcenter = (bounds[:, 0] + bounds[:, 1]) / 2.0
+        ycenter = (bounds[:, 2] + bounds[:, 3]) / 2.0
+
+        # sort by x into vertical slices, then by y within each slice
+        x_order = np.argsort(xcenter, kind='mergesort')
+        slice_id = np.empty(self.nitems, dtype=np.int64)
+        slice_id[x_order] = np.arange(self.nitems) // slice_size
+
+        self.order = np.lexsort((ycenter, slice_id)).astype(np.int64)
+
+        self.leaf_bounds = self._group_bounds(bounds[self.order])
+        self._build_levels()
+
+    def _group_bounds(self,
+                      bounds):
+        """
+        Method to get the bounding box of each group of node_size consecutive bounding boxes
+        :param bounds: Array of shape (n, 4) (xmin, xmax, ymin, ymax)
+        :return: Array of shape (ceil(n / node_size), 4)
+        """
+        starts = np.arange(0, bounds.shape[0], self.node_size)
+
+        return np.column_stack([np.minimum.reduceat(bounds[:, 0], starts),
+                                np.maximum.reduceat(bounds[:, 1], starts),
+                                np.minimum.reduceat(bounds[:, 2], starts),
+                                np.maximum.reduceat(bounds[:, 3], starts)])
+
+    def _build_levels(self):
+        """
+        Method to build the upper levels of the tree from the leaf bounding boxes.
+        Each level groups node_size consecutive nodes of the level below; STR packing
+        keeps consecutive leaves close together, so the groups stay compact.
+        :return: None
+        """
+        self.levels = list()
+
+        level_bounds = self.leaf_bounds
+        while level_bounds.shape[0] > self.node_size:
+            level_bounds = self._group_bounds(level_bounds)
+            self.levels.append(level_bounds)
+
+    def _children(self,
+                  nodes,
+                  nchildren):
+        """
+        Method to get the children of a list of nodes, as positions in the level below
+        (or in self.order for leaves)
+        :param nodes: Numpy array of node indices
+        :param nchildren: Number of nodes (or items) in the level below
+        :return: Tuple of numpy arrays (number of children per node, child positions)
+        """
+        starts = nodes * self.node_size
+        sizes = np.minimum(starts + self.node_size, nchildren) - starts
+
+        positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+
+        return sizes, positions
+
+    @staticmethod
+    def overlaps(bounds,
+                 bbox):
+        """
+        Method to test which bounding boxes overlap a query bounding box
+        :param bounds: Array of shape (n, 4) (xmin, xmax, ymin, ymax)
+        :param bbox: Query bounding box (xmin, xmax, ymin, ymax)
+        :return: Boolean numpy array of length n
+        """
+        return (bounds[:, 0] <= bbox[1]) & (bounds[:, 1] >= bbox[0]) & \
+               (bounds[:, 2] <= bbox[3]) & (bounds[:, 3] >= bbox[2])
+
+    @staticmethod
+    def pair_overlaps(bounds,
+                      bboxes):
+        """
+        Method to test which pairs of bounding boxes overlap, row by row
+        :param bounds: Array of shape (n, 4) (xmin, xmax, ymin, ymax)
+        :param bboxes: Array of shape (n, 4) (xmin, xmax, ymin, ymax)
+        :return: Boolean numpy array of length n
+        """
+        return (bounds[:, 0] <= bboxes[:, 1]) & (bounds[:, 1] >= bboxes[:, 0]) & \
+               (bounds[:, 2] <= bboxes[:, 3]) & (bounds[:, 3] >= bboxes[:, 2])
+
+    def query(self,
+              bbox):
+        """
+        Method to find items whose bounding box intersects a query bounding box
+        :param bbox: Query bounding box (xmin, xmax, ymin, ymax)
+        :return: Sorted numpy array of item indices
+        """
+        tree = [self.leaf_bounds] + self.levels
+        nodes = np.arange(tree[-1].shape[0])
+
+        # descend from the top level to the items
+        for level in range(len(tree) - 1, -1, -1):
+            nodes = nodes[self.overlaps(tree[level][nodes], bbox)]
+
+            if nodes.shape[0] == 0:
+                return np.zeros(0, dtype=np.int64)
+
+            _, nodes = self._children(nodes, tree[level - 1].shape[0] if level > 0 else self.nitems)
+
+        candidates = self.order[nodes]
+        candidates = candidates[self.overlaps(self.bounds[candidates], bbox)]
+
+        return np.sort(candidates)
+
+    def query_bulk(self,
+                   bboxes,
+                   chunk_size=1024):
+        """
+        Method to find all (query, item) pairs with intersecting bounding boxes
+        :param bboxes: Array-like of shape (m, 4) with query bounding boxes (xmin, xmax, ymin, ymax)
+        :param chunk_size: Number of queries descending the tree at a time
+        :return: Tuple of numpy arrays (query indices, item indices) sorted by query index
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+
+        query_list = list()
+        item_list = list()
+
+        if self.nitems == 0 or bboxes.shape[0] == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        tree = [self.leaf_bounds] + self.levels
+        ntop = tree[-1].shape[0]
+
+        for start in range(0, bboxes.shape[0], chunk_size):
+            chunk = bboxes[start:start + chunk_size]
+
+            # (query, node) pairs, starting from all nodes of the top level
+            qidx = np.repeat(np.arange(chunk.shape[0]), ntop)
+            nodes = np.tile(np.arange(ntop), chunk.shape[0])
+
+            # descend the levels, expanding overlapping pairs to (query, child) pairs
+            for level in range(len(tree) - 1, -1, -1):
+                keep = self.pair_overlaps(tree[level][nodes], chunk[qidx])
+                qidx, nodes = qidx[keep], nodes[keep]
+
+                if qidx.shape[0] == 0:
+                    break
+
+                sizes, nodes = self._children(nodes, tree[level - 1].shape[0] if level > 0 else self.nitems)
+                qidx = np.repeat(qidx, sizes)
+
+            if qidx.shape[0] == 0:
+                continue
+
+            items = self.order[nodes]
+            keep = self.pair_overlaps(self.bounds[items], chunk[qidx])
+
+            query_list.append(qidx[keep] + start)
+            item_list.append(items[keep])
+
+        if len(query_list) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        query_idx = np.concatenate(query_list)
+        item_idx = np.concatenate(item_list)
+
+        sort_order = np.lexsort((item_idx, query_idx))
+
+        return query_idx[sort_order], item_idx[sort_order]
+
+    def save(self,
+             filename,
+             **meta):
+        """
+        Method to save the index to a .npz file
+        :param filename: Output file name
+        :param meta: Key word arguments with scalar metadata to store with the index
+                     (e.g. source file modification time)
+        :return: None
+        """
+        self.meta.update(meta)
+
+        with open(filename, 'wb') as fileptr:
+            np.savez(fileptr,
+                     bounds=self.bounds,
+                     order=self.order,
+                     leaf_bounds=self.leaf_bounds,
+                     node_size=np.array(self.node_size),
+                     meta_keys=np.array(list(self.meta), dtype=str),
+                     meta_values=np.array(list(self.meta[k] for k in self.meta), dtype=np.float64))
+
+    @classmethod
+    def load(cls,
+             filename):
+        """
+        Method to load an index from a .npz file written by save()
+        :param filename: Index file name
+        :return: SpatialIndex object
+        """
+        with np.load(filename, allow_pickle=False) as data:
+            index = cls(node_size=int(data['node_size']))
+            index.bounds = data['bounds']
+            index.order = data['order']
+            index.leaf_bounds = data['leaf_bounds']
+            index.nitems = index.bounds.shape[0]
+            index._build_levels()
+            index.meta = dict(zip(data['meta_keys'].tolist(),
+                                  data['meta_values'].tolist()))
+        return index
+
+    @classmethod
+    def from_file(cls,
+                  filename,
+                  **meta):
+        """
+        Method to load an index file only if its stored metadata matches the given metadata
+        :param filename: Index file name
+        :param meta: Key word arguments with scalar metadata that must match
+        :return: SpatialIndex object or None if the file is missing or out of date
+        """
+        if not os.path.isfile(filename):
+            return
+
+        try:
+            index = cls.load(filename)
+        except (IOError, OSError, ValueError, KeyError):
+            return
+
+        for key, value in meta.items():
+            if key not in index.meta or index.meta[key] != float(value):
+                return
+
+        return index
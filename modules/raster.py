@@ -1,4 +1,6 @@
 import numpy as np
+import threading
+import os
 from common import *
 from osgeo import gdal, gdal_array, ogr, osr, gdalconst
 np.set_printoptions(suppress=True)
@@ -8,7 +10,178 @@ gdal.UseExceptions()
 gdal.AllRegister()
 
 
-__all__ = ['Raster']
+__all__ = ['Raster',
+           'RasterMeta']
+
+
+class RasterMeta(object):
+    """
+    Immutable raster metadata read from a single open of a raster file.
+    Objects read from files are cached per path and file modification time.
+    """
+
+    __slots__ = ('name',
+                 'mtime',
+                 'shape',
+                 'dtype',
+                 'transform',
+                 'crs_string',
+                 'block_size',
+                 'nodatavalue',
+                 'bnames')
+
+    _cache = dict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self,
+                 name=None,
+                 mtime=None,
+                 shape=None,
+                 dtype=None,
+                 transform=None,
+                 crs_string=None,
+                 block_size=None,
+                 nodatavalue=None,
+                 bnames=None):
+        """
+        Constructor for class RasterMeta
+        :param name: Name of the raster file with full path
+        :param mtime: File modification time when the metadata was read
+        :param shape: Tuple of (bands, rows, columns)
+        :param dtype: GDAL data type of the first band
+        :param transform: Geotransform tuple
+        :param crs_string: WKT string of the raster spatial reference
+        :param block_size: Tuple of (x, y) natural block size of the first band
+        :param nodatavalue: No data value of the first band
+        :param bnames: Tuple of band descriptions
+        """
+        values = (name,
+                  mtime,
+                  tuple(shape) if shape is not None else None,
+                  dtype,
+                  tuple(transform) if transform is not None else None,
+                  crs_string,
+                  tuple(block_size) if block_size is not None else None,
+                  nodatavalue,
+                  tuple(bnames) if bnames is not None else tuple())
+
+        for slot, value in zip(self.__slots__, values):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("RasterMeta is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError("RasterMeta is immutable")
+
+    def __repr__(self):
+        return "<RasterMeta {} of size {}x{}x{} ".format(Handler(self.name).basename,
+                                                         *self.shape) + \
+               "datatype {} 'no-data' value {}>".format(str(self.dtype),
+                                                        str(self.nodatavalue))
+
+    @classmethod
+    def from_datasource(cls,
+                        fileptr,
+                        name=None,
+                        mtime=None):
+        """
+        Method to read metadata from an open GDAL dataset
+        :param fileptr: GDAL dataset
+        :param name: Name of the raster file
+        :param mtime: File modification time
+        :return: RasterMeta object
+        """
+        nbands = fileptr.RasterCount
+        band = fileptr.GetRasterBand(1) if nbands > 0 else None
+
+        return cls(name=name,
+                   mtime=mtime,
+                   shape=(nbands, fileptr.RasterYSize, fileptr.RasterXSize),
+                   dtype=band.DataType if band is not None else None,
+                   transform=fileptr.GetGeoTransform(),
+                   crs_string=fileptr.GetProjection(),
+                   block_size=band.GetBlockSize() if band is not None else None,
+                   nodatavalue=band.GetNoDataValue() if band is not None else None,
+                   bnames=list(fileptr.GetRasterBand(i + 1).GetDescription() for i in range(nbands)))
+
+    @classmethod
+    def from_file(cls,
+                  filename,
+                  fileptr=None):
+        """
+        Method to get metadata of a raster file, opening the file only if the
+        file is not already in the cache or has been modified since it was cached
+        :param filename: Name of the raster file with full path
+        :param fileptr: Already open GDAL dataset for the file (optional)
+        :return: RasterMeta object
+        """
+        if 'vsimem' in filename:
+            if fileptr is None:
+                fileptr = gdal.Open(filename)
+            return cls.from_datasource(fileptr, name=filename)
+
+        key = os.path.abspath(filename)
+        mtime = os.path.getmtime(key)
+
+        with cls._cache_lock:
+            meta = cls._cache.get(key)
+
+        if meta is not None and meta.mtime == mtime:
+            return meta
+
+        if fileptr is None:
+            fileptr = gdal.Open(filename)
+
+        meta = cls.from_datasource(fileptr,
+                                   name=filename,
+                                   mtime=mtime)
+        fileptr = None
+
+        with cls._cache_lock:
+            cls._cache[key] = meta
+
+        return meta
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Method to empty the metadata cache
+        """
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    @property
+    def metadict(self):
+        """
+        Metadata dictionary in the format of Raster.get_raster_metadict
+        :return: Dictionary
+        """
+        return {'ulx': self.transform[0],
+                'uly': self.transform[3],
+                'xpixel': abs(self.transform[1]),
+                'ypixel': abs(self.transform[5]),
+                'rotationx': self.transform[2],
+                'rotationy': self.transform[4],
+                'datatype': self.dtype,
+                'columns': self.shape[2],
+                'rows': self.shape[1],
+                'bands': self.shape[0],
+                'projection': self.crs_string,
+                'name': Handler(self.name).basename}
+
+    @property
+    def bounds(self):
+        """
+        Raster footprint in the format (xmin, xmax, ymin, ymax)
+        :return: Tuple
+        """
+        xs = (self.transform[0],
+              self.transform[0] + self.transform[1] * self.shape[2])
+        ys = (self.transform[3],
+              self.transform[3] + self.transform[5] * self.shape[1])
+
+        return min(xs), max(xs), min(ys), max(ys)
 
 
 class Raster(object):
@@ -41,6 +214,7 @@ class Raster(object):
         self.ntiles = None
         self.bounds = None
         self.init = False
+        self.meta = None
         self.stats = dict()
 
     def __repr__(self):
@@ -259,11 +433,15 @@ class Raster(object):
         if Handler(raster_name).file_exists() or 'vsimem' in self.name:
             fileptr = gdal.Open(raster_name)  # open file
             self.datasource = fileptr
-            self.metadict = Raster.get_raster_metadict(file_name=raster_name)
+            self.meta = RasterMeta.from_file(raster_name,
+                                             fileptr=fileptr)
+            self.metadict = self.meta.metadict
 
         elif self.datasource is not None:
             fileptr = self.datasource
-            self.metadict = Raster.get_raster_metadict(file_ptr=fileptr)
+            self.meta = RasterMeta.from_datasource(fileptr,
+                                                   name=raster_name)
+            self.metadict = self.meta.metadict
 
         else:
             raise ValueError('No datasource found')
@@ -348,18 +526,13 @@ class Raster(object):
 
         # if get_array is false
         else:
-            # get band names
-            names = list()
-            for i in range(0, bands):
-                names.append(fileptr.GetRasterBand(i + 1).GetDescription())
-
             # assign to empty class object without the array
-            self.bnames = names
-            self.shape = [bands, rows, cols]
-            self.transform = fileptr.GetGeoTransform()
-            self.crs_string = fileptr.GetProjection()
-            self.dtype = fileptr.GetRasterBand(1).DataType
-            self.nodatavalue = fileptr.GetRasterBand(1).GetNoDataValue()
+            self.bnames = list(self.meta.bnames)
+            self.shape = list(self.meta.shape)
+            self.transform = self.meta.transform
+            self.crs_string = self.meta.crs_string
+            self.dtype = self.meta.dtype
+            self.nodatavalue = self.meta.nodatavalue
 
         self.bounds = self.get_bounds()
 
@@ -367,6 +540,39 @@ class Raster(object):
         if use_dict is not None:
             self.bnames = [use_dict[sensor][b] for b in self.bnames]
 
+    def load_meta(self):
+        """
+        Load raster metadata (shape, transform, crs, data type, no-data value, band names)
+        from the metadata cache without keeping the file open. This is a lighter
+        alternative to initialize() when no pixel values need to be read.
+        :return: RasterMeta object
+        """
+        if self.meta is None:
+            if self.datasource is not None:
+                self.meta = RasterMeta.from_datasource(self.datasource,
+                                                       name=self.name)
+            elif Handler(self.name).file_exists() or 'vsimem' in self.name:
+                self.meta = RasterMeta.from_file(self.name)
+            else:
+                raise ValueError('No datasource found')
+
+            if self.shape is None:
+                self.shape = list(self.meta.shape)
+            if self.transform is None:
+                self.transform = self.meta.transform
+            if self.crs_string is None:
+                self.crs_string = self.meta.crs_string
+            if self.dtype is None:
+                self.dtype = self.meta.dtype
+            if self.bnames is None:
+                self.bnames = list(self.meta.bnames)
+            if self.nodatavalue is None:
+                self.nodatavalue = self.meta.nodatavalue
+            if self.metadict is None:
+                self.metadict = self.meta.metadict
+
+        return self.meta
+
     def set_nodataval(self,
                       in_nodataval=255,
                       out_nodataval=0,
@@ -522,8 +728,8 @@ class Raster(object):
         """
         if file_name is not None:
             if Handler(file_name).file_exists():
-                # open raster
-                img_pointer = gdal.Open(file_name)
+                # read from cache or open raster once
+                return RasterMeta.from_file(file_name).metadict
             else:
                 raise ValueError("File does not exist.")
 
@@ -658,7 +864,7 @@ class Raster(object):
         :return: List of lists
         """
         if not self.init:
-            self.initialize()
+            self.load_meta()
         tie_pt = [self.transform[0], self.transform[3]]
 
         if xy_coordinates:
@@ -683,7 +889,7 @@ class Raster(object):
         :return: tuple: (xmin, xmax, ymin, ymax) in pixel coordinates
         """
         if not self.init:
-            self.initialize()
+            self.load_meta()
 
         if bound_coords is not None:
             if coords_type == 'pixel':
@@ -735,7 +941,7 @@ class Raster(object):
         :return: list of lists
         """
         if not self.init:
-            self.initialize()
+            self.load_meta()
 
         xmin, xmax, ymin, ymax = self.get_pixel_bounds(bound_coords,
                                                        coords_type)
@@ -818,13 +1024,56 @@ class Raster(object):
 
         return tile_arr
 
+    def read_block(self,
+                   block_coords,
+                   bands,
+                   finite_only=True,
+                   nan_replacement=0,
+                   datasource=None):
+        """
+        Method to read a block of the raster as a numpy array
+        :param block_coords: coordinates of the block in image coords (x, y, cols, rows)
+        :param bands: List of bands to read (index starts from one)
+        :param finite_only: If only finite values should be returned
+        :param nan_replacement: replacement for NAN values
+        :param datasource: GDAL dataset to read from (default: self.datasource)
+        :return: numpy array (2d array if only one band, else 3d array)
+        """
+        if datasource is None:
+            datasource = self.datasource
+
+        if len(bands) == 1:
+            temp_band = datasource.GetRasterBand(bands[0])
+            tile_arr = temp_band.ReadAsArray(*block_coords)
+
+        else:
+            tile_arr = np.zeros((len(bands),
+                                 block_coords[3],
+                                 block_coords[2]),
+                                gdal_array.GDALTypeCodeToNumericTypeCode(self.dtype))
+
+            for jj, band in enumerate(bands):
+                temp_band = datasource.GetRasterBand(band)
+                tile_arr[jj, :, :] = temp_band.ReadAsArray(*block_coords)
+
+        if finite_only:
+            if np.isnan(tile_arr).any() or np.isinf(tile_arr).any():
+                Opt.cprint('Non-finite values present in tile')
+
+                tile_arr[np.where(np.isnan(tile_arr))] = nan_replacement
+                tile_arr[np.where(np.isinf(tile_arr))] = nan_replacement
+
+        return tile_arr
+
     def get_next_tile(self,
                       tile_xsize=1024,
                       tile_ysize=1024,
                       bands=None,
                       get_array=True,
                       finite_only=True,
-                      nan_replacement=None):
+                      nan_replacement=None,
+                      prefetch=0,
+                      prefetch_threads=None):
 
         """
         Generator to extract raster tile by tile
@@ -834,6 +1083,10 @@ class Raster(object):
         :param get_array: If raster array should be retrieved as well
         :param finite_only: If only finite values should be returned
         :param nan_replacement: replacement for NAN values
+        :param prefetch: Number of tiles to read ahead on background threads while the
+                         current tile is processed (default: 0, no prefetching)
+        :param prefetch_threads: Number of reader threads (default: same as prefetch).
+                                 Each reader thread opens its own handle to the raster file.
         :return: Yields tuple: (tiepoint xy tuple, tile numpy array(2d array if only one band, else 3d array)
         """
 
@@ -858,37 +1111,96 @@ class Raster(object):
         else:
             raise ValueError('Unknown/unsupported data type for "bands" keyword')
 
+        if get_array and prefetch > 0:
+            for tile in self._prefetch_tiles(bands,
+                                             finite_only,
+                                             nan_replacement,
+                                             prefetch,
+                                             prefetch_threads):
+                yield tile
+            return
+
         ii = 0
         while ii < self.ntiles:
             if get_array:
+                tile_arr = self.read_block(self.tile_grid[ii]['block_coords'],
+                                           bands,
+                                           finite_only,
+                                           nan_replacement)
+            else:
+                tile_arr = None
 
-                if len(bands) == 1:
-                    temp_band = self.datasource.GetRasterBand(bands[0])
-                    tile_arr = temp_band.ReadAsArray(*self.tile_grid[ii]['block_coords'])
-
-                else:
-                    tile_arr = np.zeros((len(bands),
-                                         self.tile_grid[ii]['block_coords'][3],
-                                         self.tile_grid[ii]['block_coords'][2]),
-                                        gdal_array.GDALTypeCodeToNumericTypeCode(self.dtype))
+            yield self.tile_grid[ii]['tie_point'], tile_arr
 
-                    for jj, band in enumerate(bands):
-                        temp_band = self.datasource.GetRasterBand(band)
-                        tile_arr[jj, :, :] = temp_band.ReadAsArray(*self.tile_grid[ii]['block_coords'])
+            ii += 1
 
-                if finite_only:
-                    if np.isnan(tile_arr).any() or np.isinf(tile_arr).any():
-                        Opt.cprint('Non-finite values present in tile')
+    def _prefetch_tiles(self,
+                        bands,
+                        finite_only,
+                        nan_replacement,
+                        prefetch,
+                        prefetch_threads=None):
+        """
+        Generator to read tiles from the tile grid on background threads, keeping at most
+        'prefetch' tiles in flight. Tiles are yielded in tile grid order.
+        GDAL releases the GIL while reading, so I/O overlaps with the caller's processing.
+        :param bands: List of bands to read (index starts from one)
+        :param finite_only: If only finite values should be returned
+        :param nan_replacement: replacement for NAN values
+        :param prefetch: Maximum number of tiles read ahead
+        :param prefetch_threads: Number of reader threads (default: same as prefetch)
+        :return: Yields tuple: (tiepoint xy tuple, tile numpy array)
+        """
+        from multiprocessing.pool import ThreadPool
+        from collections import deque
+
+        # GDAL datasets cannot be shared between threads, so each reader opens its own handle.
+        # Datasets without a file (e.g. MEM) are read by a single background thread.
+        if Handler(self.name).file_exists() or 'vsimem' in self.name:
+            nthreads = prefetch_threads if prefetch_threads is not None else prefetch
+            shared = False
+        else:
+            nthreads = 1
+            shared = True
 
-                        tile_arr[np.where(np.isnan(tile_arr))] = nan_replacement
-                        tile_arr[np.where(np.isinf(tile_arr))] = nan_replacement
+        thread_data = threading.local()
 
+        def read_tile(block_coords):
+            if shared:
+                datasource = self.datasource
             else:
-                tile_arr = None
+                datasource = getattr(thread_data, 'datasource', None)
+                if datasource is None:
+                    datasource = gdal.Open(self.name)
+                    thread_data.datasource = datasource
 
-            yield self.tile_grid[ii]['tie_point'], tile_arr
+            return self.read_block(block_coords,
+                                   bands,
+                                   finite_only,
+                                   nan_replacement,
+                                   datasource=datasource)
 
-            ii += 1
+        pool = ThreadPool(max(1, int(nthreads)))
+        pending = deque()
+
+        try:
+            ii = 0
+            while ii < self.ntiles and len(pending) < prefetch:
+                pending.append((ii, pool.apply_async(read_tile, (self.tile_grid[ii]['block_coords'],))))
+                ii += 1
+
+            while len(pending) > 0:
+                jj, result = pending.popleft()
+                tile_arr = result.get()
+
+                if ii < self.ntiles:
+                    pending.append((ii, pool.apply_async(read_tile, (self.tile_grid[ii]['block_coords'],))))
+                    ii += 1
+
+                yield self.tile_grid[jj]['tie_point'], tile_arr
+        finally:
+            pool.terminate()
+            pool.join()
 
     def extract_geom(self,
                      wkt_strings,
@@ -985,6 +1297,379 @@ class Raster(object):
 
         return tile_samp_output
 
+    def iter_table_chunks(self,
+                          mask=None,
+                          sample_fraction=None,
+                          stratify_band=None,
+                          columns=None,
+                          bands=None,
+                          tile_size=(1024, 1024),
+                          seed=None):
+        """
+        Generator to stream valid raster pixels tile by tile as columnar chunks.
+        Pixels that are non-finite or equal to the no-data value in any band are excluded.
+        :param mask: Boolean numpy array of shape (rows, cols) of pixels to keep, or a function that
+                     takes a tile array (bands, rows, cols) and returns a boolean array (rows, cols)
+        :param sample_fraction: Fraction of valid pixels to keep at random (0-1), or a dictionary of
+                                {stratum value: fraction} for stratified subsampling using stratify_band
+        :param stratify_band: Band name or index (starting at 0) with the strata for sample_fraction
+        :param columns: List of columns to output. Options: 'x', 'y', 'lon', 'lat', 'row', 'col'
+                        and band names (default: x, y, lon, lat, and all bands)
+        :param bands: List of bands to read (default: None, gets all bands; Index starts at 0)
+        :param tile_size: Tile size (x, y) in pixels (default: (1024, 1024))
+        :param seed: Random seed for subsampling
+        :return: Yields dictionary of {column name: 1d numpy array}
+        """
+
+        if not self.init:
+            self.initialize()
+
+        if bands is None:
+            bands = list(range(self.shape[0]))
+
+        bnames = list(self.bnames[b] if (self.bnames is not None and b < len(self.bnames) and
+                                         len(self.bnames[b]) > 0) else 'band_{}'.format(str(b + 1))
+                      for b in bands)
+
+        if columns is None:
+            columns = ['x', 'y', 'lon', 'lat'] + bnames
+
+        if stratify_band is not None:
+            if type(stratify_band) == str:
+                stratify_band = bnames.index(stratify_band)
+            else:
+                stratify_band = bands.index(stratify_band)
+
+        if type(sample_fraction) == dict and stratify_band is None:
+            raise ValueError('Stratified sample fractions need a stratify_band')
+
+        if 'lon' in columns or 'lat' in columns:
+            transform_tool = SpatialRefCache.get_transform(self.crs_string,
+                                                           4326,
+                                                           'wkt',
+                                                           'epsg')
+        else:
+            transform_tool = None
+
+        random_state = np.random.RandomState(seed)
+        nodatavalue = self.nodatavalue
+        gt = self.transform
+
+        # tiles are computed locally so the raster's own tile grid is left untouched
+        tile_xsize, tile_ysize = tile_size
+        block_coords = list((x, y, min(tile_xsize, self.shape[2] - x), min(tile_ysize, self.shape[1] - y))
+                            for y in xrange(0, self.shape[1], tile_ysize)
+                            for x in xrange(0, self.shape[2], tile_xsize))
+
+        for x0, y0, cols, rows in block_coords:
+
+            tile_arr = np.zeros((len(bands), rows, cols),
+                                gdal_array.GDALTypeCodeToNumericTypeCode(self.dtype))
+            for jj, band in enumerate(bands):
+                tile_arr[jj, :, :] = self.datasource.GetRasterBand(band + 1).ReadAsArray(x0, y0, cols, rows)
+
+            valid = np.ones((rows, cols), dtype=bool)
+            if tile_arr.dtype.kind == 'f':
+                valid &= np.isfinite(tile_arr).all(axis=0)
+            if nodatavalue is not None:
+                valid &= (tile_arr != nodatavalue).all(axis=0)
+
+            if mask is not None:
+                if callable(mask):
+                    valid &= np.asarray(mask(tile_arr), dtype=bool)
+                else:
+                    valid &= np.asarray(mask[y0:y0 + rows, x0:x0 + cols], dtype=bool)
+
+            pix_y, pix_x = np.nonzero(valid)
+
+            if sample_fraction is not None and pix_x.shape[0] > 0:
+                if type(sample_fraction) == dict:
+                    strata = tile_arr[stratify_band, pix_y, pix_x]
+                    fraction = np.zeros(pix_x.shape[0], dtype=np.float64)
+                    for stratum, stratum_fraction in sample_fraction.items():
+                        fraction[strata == stratum] = stratum_fraction
+                else:
+                    fraction = float(sample_fraction)
+
+                keep = random_state.random_sample(pix_x.shape[0]) < fraction
+                pix_y, pix_x = pix_y[keep], pix_x[keep]
+
+            if pix_x.shape[0] == 0:
+                continue
+
+            chunk = dict()
+            col_loc = pix_x + x0 + 0.5
+            row_loc = pix_y + y0 + 0.5
+
+            if any(elem in columns for elem in ('x', 'y', 'lon', 'lat')):
+                x_coords = gt[0] + col_loc * gt[1] + row_loc * gt[2]
+                y_coords = gt[3] + col_loc * gt[4] + row_loc * gt[5]
+
+                chunk['x'] = x_coords
+                chunk['y'] = y_coords
+
+                if transform_tool is not None:
+                    lonlat = np.array(transform_tool.TransformPoints(np.column_stack([x_coords,
+                                                                                      y_coords]).tolist()))
+                    chunk['lon'] = lonlat[:, 0]
+                    chunk['lat'] = lonlat[:, 1]
+
+            chunk['row'] = pix_y + y0
+            chunk['col'] = pix_x + x0
+
+            for jj, bname in enumerate(bnames):
+                if bname in columns:
+                    chunk[bname] = tile_arr[jj, pix_y, pix_x]
+
+            yield dict((column, chunk[column]) for column in columns)
+
+    def to_table(self,
+                 outfile,
+                 out_format=None,
+                 mask=None,
+                 sample_fraction=None,
+                 stratify_band=None,
+                 columns=None,
+                 bands=None,
+                 tile_size=(1024, 1024),
+                 seed=None,
+                 verbose=False):
+        """
+        Method to export valid raster pixels to a table file with bounded memory.
+        Pixels are streamed tile by tile as columnar chunks (see iter_table_chunks).
+        :param outfile: Output file name
+        :param out_format: Output format: 'csv', 'npz' or 'parquet' (default: from outfile extension).
+                           NPZ files store one array per column per chunk, named '<column>/<chunk number>'.
+                           Parquet output needs the pyarrow package.
+        :param mask: Boolean array or function to select pixels (see iter_table_chunks)
+        :param sample_fraction: Random or stratified sample fraction (see iter_table_chunks)
+        :param stratify_band: Band name or index with strata for sample_fraction
+        :param columns: List of output columns (see iter_table_chunks)
+        :param bands: List of bands to read (Index starts at 0)
+        :param tile_size: Tile size (x, y) in pixels
+        :param seed: Random seed for subsampling
+        :param verbose: If the steps should be displayed
+        :return: Number of rows written
+        """
+
+        if out_format is None:
+            out_format = Handler(outfile).basename.split('.')[-1]
+        out_format = out_format.lower()
+
+        if out_format not in ('csv', 'npz', 'parquet'):
+            raise ValueError('Unsupported table format: {}'.format(out_format))
+
+        chunks = self.iter_table_chunks(mask=mask,
+                                        sample_fraction=sample_fraction,
+                                        stratify_band=stratify_band,
+                                        columns=columns,
+                                        bands=bands,
+                                        tile_size=tile_size,
+                                        seed=seed)
+
+        outfile = Handler(outfile).file_remove_check()
+        nrows = 0
+
+        if out_format == 'csv':
+            with open(outfile, 'w') as fileptr:
+                header = True
+                for chunk in chunks:
+                    names = list(chunk)
+                    if header:
+                        fileptr.write(','.join(names) + '\n')
+                        header = False
+
+                    fmt = list('%d' if chunk[name].dtype.kind in ('i', 'u', 'b') else '%.10g'
+                               for name in names)
+                    np.savetxt(fileptr, np.column_stack(list(chunk[name] for name in names)),
+                               delimiter=',', fmt=fmt)
+                    nrows += chunk[names[0]].shape[0]
+
+                    if verbose:
+                        Opt.cprint('Rows written: {}'.format(str(nrows)))
+
+        elif out_format == 'npz':
+            import zipfile
+            import io
+
+            with zipfile.ZipFile(outfile, 'w', zipfile.ZIP_STORED, allowZip64=True) as zipptr:
+                for ichunk, chunk in enumerate(chunks):
+                    for name, arr in chunk.items():
+                        buf = io.BytesIO()
+                        np.lib.format.write_array(buf, np.ascontiguousarray(arr), allow_pickle=False)
+                        zipptr.writestr('{}/{}.npy'.format(name, str(ichunk).zfill(6)), buf.getvalue())
+                    nrows += arr.shape[0]
+
+                    if verbose:
+                        Opt.cprint('Rows written: {}'.format(str(nrows)))
+
+        else:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError('Parquet output needs the pyarrow package')
+
+            writer = None
+            for chunk in chunks:
+                table = pyarrow.Table.from_arrays(list(pyarrow.array(arr) for arr in chunk.values()),
+                                                  names=list(chunk))
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(outfile, table.schema)
+                writer.write_table(table)
+                nrows += table.num_rows
+
+                if verbose:
+                    Opt.cprint('Rows written: {}'.format(str(nrows)))
+
+            if writer is not None:
+                writer.close()
+
+        return nrows
+
+    def clip(self,
+             bounds=None,
+             vector=None,
+             outfile=None,
+             bands=None,
+             nodatavalue=None,
+             tile_size=(1024, 1024),
+             driver='GTiff',
+             verbose=False,
+             **creation_options):
+        """
+        Method to clip the raster to a bounding box or to the polygons of a Vector.
+        Only the pixel window covering the clip area is read. If a vector is given, pixels
+        outside its polygons are set to the no-data value using an in-memory rasterized cutline.
+        :param bounds: Bounding box (xmin, xmax, ymin, ymax) in raster CRS coordinates
+        :param vector: Vector object in the raster CRS to clip with (bounds default to the vector extent)
+        :param outfile: Output file name. If None, an in-memory Raster is returned
+        :param bands: List of bands to clip (default: None, gets all bands; Index starts at 0)
+        :param nodatavalue: No data value for masked pixels (default: raster no-data value or 0)
+        :param tile_size: Tile size (x, y) in pixels used to stream the window to outfile
+        :param driver: Output file driver (default: 'GTiff')
+        :param verbose: If the steps should be displayed
+        :param creation_options: keyword arguments for output creation options (e.g. compress='lzw')
+        :return: Raster object (in memory if outfile is None)
+        """
+
+        if not self.init:
+            self.initialize()
+
+        if bounds is None:
+            if vector is None:
+                raise ValueError("No bounds or vector to clip with")
+            bounds = vector.layer.GetExtent()
+
+        if vector is not None:
+            raster_spref = SpatialRefCache.get_spref(self.crs_string, 'wkt')
+            if vector.spref is not None and raster_spref.IsSame(vector.spref) != 1:
+                raise RuntimeError("Coordinate system mismatch between raster and vector")
+
+        if bands is None:
+            bands = list(range(self.shape[0]))
+
+        if nodatavalue is None:
+            nodatavalue = self.nodatavalue if self.nodatavalue is not None else 0
+
+        gt = self.transform
+        xmin, xmax, ymin, ymax = self.get_pixel_bounds(bounds,
+                                                       coords_type='crs')
+
+        # include pixels partially covered by the right and bottom edges
+        if xmax < self.shape[2] and bounds[1] > gt[0] + xmax * gt[1]:
+            xmax += 1
+        if ymax < self.shape[1] and bounds[2] < gt[3] + ymax * gt[5]:
+            ymax += 1
+
+        cols, rows = xmax - xmin, ymax - ymin
+        out_transform = (gt[0] + xmin * gt[1], gt[1], gt[2],
+                         gt[3] + ymin * gt[5], gt[4], gt[5])
+
+        bnames = list(self.bnames[b] if (self.bnames is not None and b < len(self.bnames))
+                      else 'band_{}'.format(str(b + 1)) for b in bands)
+
+        if verbose:
+            Opt.cprint('Clipping window (x, y, cols, rows): {}'.format(str((xmin, ymin, cols, rows))))
+
+        def clip_block(x, y, block_cols, block_rows):
+            block = np.zeros((len(bands), block_rows, block_cols),
+                             gdal_array.GDALTypeCodeToNumericTypeCode(self.dtype))
+
+            for jj, band in enumerate(bands):
+                block[jj, :, :] = self.datasource.GetRasterBand(band + 1).ReadAsArray(x, y,
+                                                                                      block_cols,
+                                                                                      block_rows)
+            if vector is not None:
+                mask_ds = gdal.GetDriverByName('MEM').Create('', block_cols, block_rows, 1, gdal.GDT_Byte)
+                mask_ds.SetGeoTransform((gt[0] + x * gt[1], gt[1], gt[2],
+                                         gt[3] + y * gt[5], gt[4], gt[5]))
+                mask_ds.SetProjection(self.crs_string)
+
+                gdal.RasterizeLayer(mask_ds, [1], vector.layer, burn_values=[1])
+
+                mask = mask_ds.GetRasterBand(1).ReadAsArray() == 0
+                block[:, mask] = nodatavalue
+                mask_ds = None
+
+            return block
+
+        if outfile is None:
+            out_ds = gdal.GetDriverByName('MEM').Create('', cols, rows, len(bands), self.dtype)
+            array = clip_block(xmin, ymin, cols, rows)
+        else:
+            creation_options_list = list('{}={}'.format(key.upper(), str(value).upper())
+                                         for key, value in creation_options.items())
+            outfile = Handler(filename=outfile).file_remove_check()
+            out_ds = gdal.GetDriverByName(driver).Create(outfile, cols, rows, len(bands), self.dtype,
+                                                         creation_options_list)
+            array = None
+
+        out_ds.SetGeoTransform(out_transform)
+        out_ds.SetProjection(self.crs_string)
+
+        for jj, bname in enumerate(bnames):
+            out_band = out_ds.GetRasterBand(jj + 1)
+            out_band.SetDescription(bname)
+            out_band.SetNoDataValue(nodatavalue)
+            if array is not None:
+                out_band.WriteArray(array[jj, :, :], 0, 0)
+
+        if array is None:
+            for y in range(0, rows, tile_size[1]):
+                block_rows = min(tile_size[1], rows - y)
+                for x in range(0, cols, tile_size[0]):
+                    block_cols = min(tile_size[0], cols - x)
+                    block = clip_block(xmin + x, ymin + y, block_cols, block_rows)
+
+                    for jj in range(len(bands)):
+                        out_ds.GetRasterBand(jj + 1).WriteArray(block[jj, :, :], x, y)
+
+            out_ds.FlushCache()
+            out_ds = None
+
+            out_raster = Raster(outfile)
+            out_raster.initialize()
+            return out_raster
+
+        out_raster = Raster('clip',
+                            array=array[0, :, :] if len(bands) == 1 else array,
+                            bnames=bnames,
+                            dtype=self.dtype,
+                            shape=[len(bands), rows, cols],
+                            transform=out_transform,
+                            crs_string=self.crs_string)
+        out_raster.datasource = out_ds
+        out_raster.nodatavalue = nodatavalue
+        out_raster.array_offsets = (0, 0, cols, rows)
+        out_raster.meta = RasterMeta.from_datasource(out_ds,
+                                                     name='clip')
+        out_raster.metadict = out_raster.meta.metadict
+        out_raster.bounds = out_raster.get_bounds()
+        out_raster.init = True
+
+        return out_raster
+
     def get_stats(self,
                   print_stats=False,
                   approx=False):
@@ -1108,14 +1793,12 @@ class Raster(object):
         if out_spref is not None:
             sp = out_spref
         else:
-            sp = osr.SpatialReference()
-
             if out_epsg is not None:
-                res = sp.ImportFromEPSG(out_epsg)
+                sp = SpatialRefCache.get_spref(out_epsg, 'epsg')
             elif out_wkt is not None:
-                res = sp.ImportFromWkt(out_wkt)
+                sp = SpatialRefCache.get_spref(out_wkt, 'wkt')
             elif out_proj4 is not None:
-                res = sp.ImportFromProj4(out_proj4)
+                sp = SpatialRefCache.get_spref(out_proj4, 'proj4')
             else:
                 raise ValueError("Output Spatial reference not provided")
 
@@ -5,6 +5,8 @@ import numpy as np
 from shapely.geometry import Polygon, mapping
 from osgeo import ogr, gdal
 import sys
+from index import SpatialIndex
+from geometry import GeometryStore
 
 """
 This module houses functions specific to the data used
@@ -14,7 +16,8 @@ __all__ = ['bname_dict',
            'get_TCdata_filepath',
            'TCserver',
            'read_y_param_from_summary',
-           'find_path_row']
+           'find_path_row',
+           'WRSLocator']
 
 # dictionary for a use case
 bname_dict = {
@@ -170,39 +173,243 @@ def read_y_param_from_summary(csv_file):
     }
 
 
-def find_path_row(polygonfile, wrsfile):
+class WRSLocator(object):
     """
-    module to identify path row of intersecting landsat footprints
-    :param polygonfile: Shapefile with only one polygon
-    :param wrsfile: WRS2 - descending shapefile
-    :return: list of path and row tuples
+    Landsat WRS-2 path/row locator. The WRS-2 layer is read once into WKB geometries,
+    path/row arrays and a bounding box index, and cached to .npz files next to the
+    WRS-2 file (path/row arrays, and geometries saved with GeometryStore.save) that are
+    reused as long as the WRS-2 file is not modified.
     """
 
-    fieldshpfile = ogr.Open(polygonfile)
-    fieldshape = fieldshpfile.GetLayer(0)
-    fieldfeat = fieldshape.GetFeature(0)
-    fieldgeom = fieldfeat.GetGeometryRef()
+    _locators = dict()
+
+    def __init__(self,
+                 wrsfile,
+                 cache_file=None,
+                 path_field='PATH',
+                 row_field='ROW'):
+        """
+        Constructor for class WRSLocator
+        :param wrsfile: WRS2 - descending shapefile
+        :param cache_file: Cache file name (default: <wrsfile>.pathrow.npz); geometries are
+                           cached in <cache_file minus .npz>.geoms.npz
+        :param path_field: Name of the path attribute
+        :param row_field: Name of the row attribute
+        """
+        self.wrsfile = wrsfile
+        self.cache_file = cache_file if cache_file is not None else wrsfile + '.pathrow.npz'
+        self.geom_cache_file = os.path.splitext(self.cache_file)[0] + '.geoms.npz'
+
+        self.path = None
+        self.row = None
+        self.geometries = None
+        self.spatial_index = None
+        self._tile_geoms = dict()
+
+        mtime = os.path.getmtime(wrsfile)
+
+        if not self.load(mtime):
+            self.read(path_field, row_field)
+            try:
+                self.save(mtime)
+            except (IOError, OSError):
+                pass
+
+        self.spatial_index = SpatialIndex(self.bounds)
+
+    def __repr__(self):
+        return "<WRSLocator with {} path/row tiles>".format(str(self.path.shape[0]))
+
+    @classmethod
+    def get(cls,
+            wrsfile):
+        """
+        Method to get the locator of a WRS-2 file, shared between calls
+        :param wrsfile: WRS2 - descending shapefile
+        :return: WRSLocator object
+        """
+        key = os.path.abspath(wrsfile)
+        locator = cls._locators.get(key)
 
-    wrsshpfile = ogr.Open(wrsfile)
-    wrsshape = wrsshpfile.GetLayer(0)
+        if locator is None or locator.mtime != os.path.getmtime(wrsfile):
+            locator = cls(wrsfile)
+            cls._locators[key] = locator
 
-    pathrow = list()
+        return locator
 
-    feature = wrsshape.GetNextFeature()
+    def read(self,
+             path_field='PATH',
+             row_field='ROW'):
+        """
+        Method to read the WRS-2 layer, with only the path and row fields
+        :param path_field: Name of the path attribute
+        :param row_field: Name of the row attribute
+        :return: None
+        """
+        wrsshpfile = ogr.Open(self.wrsfile)
+        wrsshape = wrsshpfile.GetLayer(0)
 
-    while feature:
+        layer_defn = wrsshape.GetLayerDefn()
+        wrsshape.SetIgnoredFields(list(layer_defn.GetFieldDefn(i).GetName()
+                                       for i in range(layer_defn.GetFieldCount())
+                                       if layer_defn.GetFieldDefn(i).GetName() not in (path_field, row_field)))
 
-        wrsgeom = feature.GetGeometryRef()
+        path_index = layer_defn.GetFieldIndex(path_field)
+        row_index = layer_defn.GetFieldIndex(row_field)
 
-        if wrsgeom.Intersects(fieldgeom):
-            path = json.loads(feature.ExportToJson())['properties']['PATH']
-            row = json.loads(feature.ExportToJson())['properties']['ROW']
-            pathrow.append((path, row))
+        path_list = list()
+        row_list = list()
+        bounds_list = list()
+        self.geometries = GeometryStore()
 
         feature = wrsshape.GetNextFeature()
 
+        while feature:
+            wrsgeom = feature.GetGeometryRef()
+
+            if wrsgeom is not None:
+                path_list.append(feature.GetFieldAsInteger(path_index))
+                row_list.append(feature.GetFieldAsInteger(row_index))
+                bounds_list.append(wrsgeom.GetEnvelope())
+                self.geometries.append(wrsgeom)
+
+            feature = wrsshape.GetNextFeature()
+
+        wrsshpfile = None
+
+        self.path = np.array(path_list, dtype=np.int32)
+        self.row = np.array(row_list, dtype=np.int32)
+        self.bounds = np.array(bounds_list, dtype=np.float64).reshape(-1, 4)
+
+    def save(self,
+             mtime):
+        """
+        Method to write the locator arrays to the cache file
+        :param mtime: Modification time of the WRS-2 file
+        :return: None
+        """
+        self.mtime = mtime
+
+        with open(self.cache_file, 'wb') as fileptr:
+            np.savez(fileptr,
+                     path=self.path,
+                     row=self.row,
+                     bounds=self.bounds,
+                     mtime=np.array(mtime, dtype=np.float64))
+
+        self.geometries.save(self.geom_cache_file,
+                             mtime=mtime,
+                             nfeat=len(self.geometries))
+
+    def load(self,
+             mtime):
+        """
+        Method to read the locator arrays from the cache file if it matches the WRS-2 file
+        :param mtime: Modification time of the WRS-2 file
+        :return: True if the cache file was loaded
+        """
+        self.mtime = mtime
+
+        if not os.path.isfile(self.cache_file):
+            return False
+
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as data:
+                if float(data['mtime']) != float(mtime):
+                    return False
+
+                path = data['path']
+                row = data['row']
+                bounds = data['bounds']
+        except (IOError, OSError, ValueError, KeyError):
+            return False
+
+        geometries = GeometryStore.from_file(self.geom_cache_file,
+                                             mtime=mtime,
+                                             nfeat=path.shape[0])
+        if geometries is None:
+            return False
+
+        self.path, self.row, self.bounds = path, row, bounds
+        self.geometries = geometries
+
+        return True
+
+    def _tile_geom(self,
+                   i):
+        """
+        Method to get a (cached) WRS-2 tile geometry
+        :param i: Tile index
+        :return: OGR geometry
+        """
+        geom = self._tile_geoms.get(i)
+        if geom is None:
+            geom = self.geometries[i]
+            self._tile_geoms[i] = geom
+        return geom
+
+    def locate(self,
+               geoms):
+        """
+        Method to find the WRS-2 path/rows intersecting each query geometry
+        :param geoms: List of OGR geometries or WKT strings, or array-like of shape (n, 2)
+                      with point (x, y) coordinates, in the WRS-2 spatial reference
+        :return: List of lists of (path, row) tuples, one list per query geometry
+        """
+        if len(geoms) > 0 and type(geoms[0]) not in (ogr.Geometry, str):
+            coords = np.asarray(geoms, dtype=np.float64).reshape(-1, 2)
+            query_bounds = np.column_stack([coords[:, 0], coords[:, 0], coords[:, 1], coords[:, 1]])
+            query_geoms = None
+        else:
+            query_geoms = list(ogr.CreateGeometryFromWkt(geom) if type(geom) == str else geom
+                               for geom in geoms)
+            query_bounds = np.array(list(geom.GetEnvelope() for geom in query_geoms),
+                                    dtype=np.float64).reshape(-1, 4)
+            coords = None
+
+        query_index, tile_index = self.spatial_index.query_bulk(query_bounds)
+
+        pathrow = list(list() for _ in range(query_bounds.shape[0]))
+
+        for j, i in zip(query_index.tolist(), tile_index.tolist()):
+            if query_geoms is not None:
+                query_geom = query_geoms[j]
+            else:
+                query_geom = ogr.Geometry(ogr.wkbPoint)
+                query_geom.AddPoint_2D(float(coords[j, 0]), float(coords[j, 1]))
+
+            if self._tile_geom(i).Intersects(query_geom):
+                pathrow[j].append((int(self.path[i]), int(self.row[i])))
+
+        return pathrow
+
+
+def find_path_row(polygonfile, wrsfile, all_features=False):
+    """
+    module to identify path row of intersecting landsat footprints
+    :param polygonfile: Shapefile with only one polygon
+    :param wrsfile: WRS2 - descending shapefile
+    :param all_features: If the path/rows of all polygons in the file should be returned
+    :return: list of path and row tuples (list of lists, one per polygon, if all_features is True)
+    """
+
+    fieldshpfile = ogr.Open(polygonfile)
+    fieldshape = fieldshpfile.GetLayer(0)
+
+    if all_features:
+        fieldgeoms = list()
+        fieldfeat = fieldshape.GetNextFeature()
+        while fieldfeat:
+            fieldgeoms.append(fieldfeat.GetGeometryRef().Clone())
+            fieldfeat = fieldshape.GetNextFeature()
+    else:
+        fieldgeoms = [fieldshape.GetFeature(0).GetGeometryRef().Clone()]
+
     fieldshpfile = None
-    wrsshpfile = None
 
-    return pathrow
+    pathrow = WRSLocator.get(wrsfile).locate(fieldgeoms)
+
+    if all_features:
+        return pathrow
 
+    return pathrow[0]
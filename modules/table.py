@@ -0,0 +1,486 @@
+import numpy as np
+import sys
+from collections import OrderedDict
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+from osgeo import ogr
+from common import *
+from samples import Samples
+
+
+__all__ = ['AttributeTable',
+           'AttributeRecord']
+
+
+class AttributeRecord(MutableMapping):
+    """
+    Compact, dictionary-like attribute record of one feature.
+    Field names are a tuple shared by all records of a layer and values are kept
+    in a tuple, so a record costs much less memory than a dictionary.
+    Records are mappings but not dicts: use to_dict() where a dict is needed (e.g. json.dumps).
+    """
+
+    __slots__ = ('_names', '_values')
+
+    def __init__(self,
+                 names,
+                 values):
+        """
+        Constructor for class AttributeRecord
+        :param names: Tuple of field names (shared between records)
+        :param values: Tuple of values in the order of names
+        """
+        self._names = tuple(names)
+        self._values = tuple(values)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __getitem__(self, name):
+        try:
+            return self._values[self._names.index(name)]
+        except ValueError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        if name in self._names:
+            index = self._names.index(name)
+            self._values = self._values[:index] + (value,) + self._values[index + 1:]
+        else:
+            self._names = self._names + (name,)
+            self._values = self._values + (value,)
+
+    def __delitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        index = self._names.index(name)
+        self._names = self._names[:index] + self._names[index + 1:]
+        self._values = self._values[:index] + self._values[index + 1:]
+
+    def keys(self):
+        return list(self._names)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._names, self._values))
+
+    def copy(self):
+        return AttributeRecord(self._names, self._values)
+
+    def to_dict(self):
+        """
+        Method to convert the record to a dictionary
+        :return: Dictionary
+        """
+        return dict(zip(self._names, self._values))
+
+    @classmethod
+    def from_feature(cls,
+                     feat,
+                     names,
+                     field_index=None):
+        """
+        Method to make a record from an OGR feature
+        :param feat: OGR feature
+        :param names: Tuple of field names
+        :param field_index: List of feature field indices in the order of names (default: 0 .. len(names) - 1)
+        :return: AttributeRecord object
+        """
+        if field_index is None:
+            field_index = range(len(names))
+        return cls(names, tuple(feat.GetField(i) for i in field_index))
+
+    @classmethod
+    def from_dict(cls,
+                  attr,
+                  names=None):
+        """
+        Method to make a record from a dictionary
+        :param attr: Dictionary
+        :param names: Tuple of field names to share with other records (default: keys of attr);
+                      keys of attr not in names are appended to the record
+        :return: AttributeRecord object
+        """
+        if names is None or set(names) != set(attr):
+            names = tuple(attr)
+        return cls(names, tuple(attr[name] for name in names))
+
+    @property
+    def nbytes(self):
+        """
+        Approximate number of bytes used by the record and its values (shared names are not counted)
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self._values) + \
+            sum(sys.getsizeof(value) for value in self._values)
+
+
+class AttributeTable(object):
+    """
+    Columnar attribute table with one typed numpy array per field.
+    Text fields are dictionary encoded: each text column is stored as an array
+    of integer codes into an array of unique strings (code -1 is a null value).
+    """
+
+    def __init__(self,
+                 columns=None,
+                 categories=None):
+        """
+        Constructor for class AttributeTable
+        :param columns: Ordered dictionary of {column name: numpy array}
+        :param categories: Dictionary of {text column name: numpy array of unique strings}
+        """
+        self.columns = OrderedDict(columns) if columns is not None else OrderedDict()
+        self.categories = dict(categories) if categories is not None else dict()
+
+    def __repr__(self):
+        return "<AttributeTable with {} row(s) and {} column(s)>".format(str(len(self)),
+                                                                         str(len(self.columns)))
+
+    def __len__(self):
+        if len(self.columns) == 0:
+            return 0
+        return list(self.columns.values())[0].shape[0]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        """
+        Get a column; text columns are decoded to an array of strings
+        :param name: Column name
+        :return: numpy array
+        """
+        if name in self.categories:
+            return self.decode(self.columns[name], self.categories[name])
+        return self.columns[name]
+
+    @property
+    def names(self):
+        """
+        List of column names
+        """
+        return list(self.columns)
+
+    @staticmethod
+    def decode(codes,
+               categories):
+        """
+        Method to decode dictionary encoded text values
+        :param codes: Numpy array of integer codes (-1 for null)
+        :param categories: Numpy array of unique strings
+        :return: Numpy array of strings ('' for null)
+        """
+        lookup = np.append(categories.astype(np.object_), '')
+        return lookup[np.where(codes < 0, categories.shape[0], codes)]
+
+    @staticmethod
+    def encode(values):
+        """
+        Method to dictionary encode an array of text values
+        :param values: Iterable of strings or None
+        :return: Tuple of (numpy array of int32 codes, numpy array of unique strings)
+        """
+        values = np.array(list(values), dtype=np.object_)
+        nulls = np.array(list(elem is None for elem in values), dtype=bool)
+
+        if values.shape[0] == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.str_)
+
+        values[nulls] = ''
+        values = values.astype(np.str_)
+
+        categories, codes = np.unique(values, return_inverse=True)
+        codes = codes.astype(np.int32)
+        codes[nulls] = -1
+
+        return codes, categories
+
+    def add_column(self,
+                   name,
+                   values,
+                   text=None):
+        """
+        Method to add a column to the table
+        :param name: Column name
+        :param values: Iterable of column values
+        :param text: If the column should be dictionary encoded (default: detect from values)
+        :return: None
+        """
+        if text is None:
+            arr = np.asarray(values)
+            text = arr.dtype.kind in ('U', 'S', 'O')
+
+        if text:
+            codes, categories = self.encode(values)
+            self.columns[name] = codes
+            self.categories[name] = categories
+        else:
+            self.columns[name] = np.asarray(values)
+            self.categories.pop(name, None)
+
+    @classmethod
+    def from_layer(cls,
+                   layer,
+                   columns=None):
+        """
+        Method to build the table directly from an OGR layer in one pass over the features
+        :param layer: OGR layer
+        :param columns: List of field names to read (default: all fields)
+        :return: AttributeTable object
+        """
+        layer_defn = layer.GetLayerDefn()
+        field_defns = list(layer_defn.GetFieldDefn(i) for i in range(layer_defn.GetFieldCount()))
+
+        if columns is None:
+            columns = list(field_defn.GetName() for field_defn in field_defns)
+
+        field_index = list(layer_defn.GetFieldIndex(name) for name in columns)
+        field_types = list(field_defns[i].GetType() for i in field_index)
+
+        values = list(list() for _ in columns)
+
+        layer.ResetReading()
+        feat = layer.GetNextFeature()
+        while feat:
+            for j, i in enumerate(field_index):
+                values[j].append(feat.GetField(i) if feat.IsFieldSetAndNotNull(i) else None)
+            feat = layer.GetNextFeature()
+        layer.ResetReading()
+
+        table = cls()
+        for name, field_type, column_values in zip(columns, field_types, values):
+            if field_type in (ogr.OFTInteger, ogr.OFTInteger64):
+                if any(elem is None for elem in column_values):
+                    table.add_column(name, np.array(list(np.nan if elem is None else elem
+                                                         for elem in column_values), dtype=np.float64))
+                else:
+                    table.add_column(name, np.array(column_values, dtype=np.int64))
+            elif field_type == ogr.OFTReal:
+                table.add_column(name, np.array(list(np.nan if elem is None else elem
+                                                     for elem in column_values), dtype=np.float64))
+            else:
+                table.add_column(name, column_values, text=True)
+
+        return table
+
+    @classmethod
+    def from_dicts(cls,
+                   list_of_dicts,
+                   columns=None):
+        """
+        Method to build the table from a list of dictionaries
+        :param list_of_dicts: List of dictionaries with the same keys
+        :param columns: List of keys to use as columns (default: keys of the first dictionary)
+        :return: AttributeTable object
+        """
+        if columns is None:
+            columns = list(list_of_dicts[0]) if len(list_of_dicts) > 0 else list()
+
+        table = cls()
+        for name in columns:
+            column_values = list(elem.get(name) for elem in list_of_dicts)
+
+            if all(type(elem).__name__ in ('int', 'long') for elem in column_values):
+                table.add_column(name, np.array(column_values, dtype=np.int64))
+            elif all(type(elem) in (int, float) or elem is None for elem in column_values):
+                table.add_column(name, np.array(list(np.nan if elem is None else elem
+                                                     for elem in column_values), dtype=np.float64))
+            else:
+                table.add_column(name, list(None if elem is None else str(elem)
+                                            for elem in column_values), text=True)
+
+        return table
+
+    @classmethod
+    def from_csv(cls,
+                 csv_file,
+                 columns=None):
+        """
+        Method to build the table from a csv file with a header.
+        Column types are inferred once per column and values are converted in bulk.
+        :param csv_file: CSV file name
+        :param columns: List of column names to keep (default: all columns)
+        :return: AttributeTable object
+        """
+        names, arrays = Handler(csv_file).read_csv_columns(columns=columns)
+
+        table = cls()
+
+        for name, arr in zip(names, arrays):
+            table.add_column(name, arr, text=arr.dtype.kind in ('U', 'S', 'O'))
+
+        return table
+
+    def isin(self,
+             name,
+             values):
+        """
+        Method to get a boolean mask of rows where a column value is in a list of values.
+        For text columns the test is done on the integer codes.
+        :param name: Column name
+        :param values: Single value or list of values
+        :return: Boolean numpy array
+        """
+        if type(values) not in (list, tuple, np.ndarray, set):
+            values = [values]
+
+        if name in self.categories:
+            categories = self.categories[name]
+            codes = np.nonzero(np.isin(categories, np.array(list(str(elem) for elem in values))))[0]
+            return np.isin(self.columns[name], codes)
+        else:
+            return np.isin(self.columns[name], np.array(list(values)))
+
+    def filter(self,
+               mask):
+        """
+        Method to select rows using a boolean mask or an array of row indices
+        :param mask: Boolean numpy array or array of row indices
+        :return: AttributeTable object
+        """
+        return AttributeTable(columns=OrderedDict((name, arr[mask]) for name, arr in self.columns.items()),
+                              categories=self.categories)
+
+    def select(self,
+               columns):
+        """
+        Method to select columns
+        :param columns: List of column names
+        :return: AttributeTable object
+        """
+        return AttributeTable(columns=OrderedDict((name, self.columns[name]) for name in columns),
+                              categories=dict((name, self.categories[name]) for name in columns
+                                              if name in self.categories))
+
+    def join(self,
+             other,
+             on,
+             other_on=None,
+             columns=None,
+             how='left'):
+        """
+        Method to join columns of another table using key columns.
+        Keys in the other table should be unique; the first row is used for duplicate keys.
+        :param other: AttributeTable object
+        :param on: Key column name in self
+        :param other_on: Key column name in other (default: same as on)
+        :param columns: List of columns of other to join (default: all except the key)
+        :param how: 'left' to keep all rows of self (unmatched values are NaN or null),
+                    'inner' to keep only matched rows
+        :return: AttributeTable object
+        """
+        if other_on is None:
+            other_on = on
+
+        if columns is None:
+            columns = list(name for name in other.names if name != other_on)
+
+        left_keys = self[on]
+        right_keys = other[other_on]
+
+        uniq_keys, first_index = np.unique(right_keys, return_index=True)
+
+        if uniq_keys.shape[0] > 0:
+            pos = np.clip(np.searchsorted(uniq_keys, left_keys), 0, uniq_keys.shape[0] - 1)
+            matched = uniq_keys[pos] == left_keys
+            right_rows = first_index[pos]
+        else:
+            matched = np.zeros(len(self), dtype=bool)
+            right_rows = np.zeros(len(self), dtype=np.int64)
+
+        out = AttributeTable(columns=self.columns,
+                             categories=self.categories)
+
+        for name in columns:
+            out_name = name if name not in out.columns else name + '_1'
+            values = other.columns[name][right_rows] if len(other) > 0 else \
+                np.zeros(len(self), dtype=other.columns[name].dtype)
+
+            if name in other.categories:
+                values = np.where(matched, values, -1).astype(np.int32)
+                out.categories[out_name] = other.categories[name]
+            elif not matched.all():
+                values = np.where(matched, values, np.nan)
+
+            out.columns[out_name] = values
+
+        if how == 'inner':
+            out = out.filter(matched)
+
+        return out
+
+    def to_dicts(self):
+        """
+        Method to convert the table to a list of dictionaries
+        :return: List of dictionaries
+        """
+        names = self.names
+        decoded = list(self[name].tolist() for name in names)
+
+        return list(dict(zip(names, row)) for row in zip(*decoded))
+
+    def to_records(self):
+        """
+        Method to convert the table to a list of compact attribute records
+        :return: List of AttributeRecord objects
+        """
+        names = tuple(self.names)
+        decoded = list(self[name].tolist() for name in names)
+
+        return list(AttributeRecord(names, row) for row in zip(*decoded))
+
+    def to_samples(self):
+        """
+        Method to convert the table to a Samples object
+        :return: Samples object
+        """
+        return Samples(samples=self.to_dicts(),
+                       names=self.names)
+
+    def to_csv(self,
+               outfile,
+               delimiter=',',
+               chunk_size=100000):
+        """
+        Method to write the table to a csv file
+        :param outfile: Output file name
+        :param delimiter: Delimiter (default: ',')
+        :param chunk_size: Number of rows converted to text at a time
+        :return: None
+        """
+        names = self.names
+
+        with open(outfile, 'w') as fileptr:
+            fileptr.write(delimiter.join(names) + '\n')
+
+            for start in range(0, len(self), chunk_size):
+                # text columns are decoded one chunk of codes at a time
+                text_columns = list((self.decode(self.columns[name][start:start + chunk_size], self.categories[name])
+                                     if name in self.categories
+                                     else self.columns[name][start:start + chunk_size]).astype(np.str_)
+                                    for name in names)
+                fileptr.write('\n'.join(delimiter.join(row) for row in zip(*text_columns)) + '\n')
+
+    def to_npz(self,
+               outfile):
+        """
+        Method to write the table to a .npz file with one array per column
+        :param outfile: Output file name
+        :return: None
+        """
+        with open(outfile, 'wb') as fileptr:
+            np.savez(fileptr, **dict((name, self[name].astype(np.str_) if name in self.categories
+                                      else self[name]) for name in self.names))
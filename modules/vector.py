@@ -1,9 +1,14 @@
 from osgeo import ogr, osr, gdal
+import numpy as np
 import math
 import json
 import sys
 import os
+from collections import OrderedDict
 from common import *
+from index import SpatialIndex
+from table import AttributeTable, AttributeRecord
+from geometry import GeometryStore
 
 __all__ = ['Vector']
 
@@ -26,11 +31,33 @@ class Vector(object):
                  verbose=False,
                  primary_key='fid',
                  feat_limit=None,
-                 attr_def=None):
+                 attr_def=None,
+                 lazy=False,
+                 where=None,
+                 bbox=None,
+                 mask_geom=None,
+                 columns=None,
+                 keep_features=False):
         """
         Constructor for class Vector
         :param filename: Name of the vector file (shapefile) with full path
         :param layer_index: Index of the vector layer to pull (default: 0)
+        :param lazy: If only the layer and its metadata should be read. Features, attributes
+                     and geometries are then read on demand using iter_features, iter_attributes
+                     and iter_geometries (default: False)
+        :param where: OGR SQL attribute filter, e.g. "YEAR >= 2000" (default: None)
+        :param bbox: Bounding box (xmin, xmax, ymin, ymax) in the layer spatial reference
+                     to filter features by (default: None)
+        :param mask_geom: OGR geometry or WKT string in the layer spatial reference to filter
+                          features by (default: None)
+        :param columns: List of field names to read; other fields are skipped (default: all fields)
+        :param keep_features: If the OGR features should be kept in self.features after their
+                              geometries and attributes are extracted (default: False). Attributes
+                              are kept as compact AttributeRecord objects, and iter_features()
+                              creates features from the geometries and attributes on demand.
+
+        The where, bbox and mask_geom filters and the columns selection are set on the
+        OGR layer before any feature is read, so only the matching records are read from the file.
         """
 
         self.filename = filename
@@ -38,7 +65,7 @@ class Vector(object):
 
         self.features = list()
         self.attributes = list()
-        self.wktlist = list()
+        self.geometries = GeometryStore()
 
         self.precision = 16  # Precision is set only for float attributes
         self.width = 50  # Width is set for string characters
@@ -56,12 +83,37 @@ class Vector(object):
         self.data = dict()
         self.attr_def = attr_def
 
+        self.spatial_index = None
+        self.index_file = None
+        self.coords = None  # (n, 2) point coordinates, kept in sync with the geometries or None
+        self.parent_index = None  # index of the parent feature of each feature, set by split()
+
+        self.simplified = dict()  # {(tolerance, preserve_topology): GeometryStore}
+        self.coarse_tolerance = None  # tolerance of the simplified geometries used in intersection tests
+
+        self.lazy = lazy
+        self.feat_limit = feat_limit
+        self.transform_tool = None
+        self.close_rings = geom_type == 3
+
+        self.where = None
+        self.bbox = None
+        self.mask_geom = None
+        self.columns = None
+
         if filename is not None and os.path.isfile(filename):
 
             # open vector file
             self.datasource = ogr.Open(self.filename)
             file_layer = self.datasource.GetLayerByIndex(layer_index)
 
+            # push filters down to the file layer so only matching records are read or copied
+            self.set_filter(where=where,
+                            bbox=bbox,
+                            mask_geom=mask_geom,
+                            columns=columns,
+                            layer=file_layer)
+
             if in_memory:
                 out_driver = ogr.GetDriverByName('Memory')
                 out_datasource = out_driver.CreateDataSource('mem_source')
@@ -77,8 +129,7 @@ class Vector(object):
             self.spref = self.layer.GetSpatialRef()
 
             if spref_str is not None:
-                dest_spref = osr.SpatialReference()
-                res = dest_spref.ImportFromWkt(spref_str)
+                dest_spref = SpatialRefCache.get_spref(spref_str, 'wkt')
 
                 if self.spref.IsSame(dest_spref) == 1:
                     dest_spref = None
@@ -103,58 +154,52 @@ class Vector(object):
             layer_definition = self.layer.GetLayerDefn()
             self.fields = [layer_definition.GetFieldDefn(i) for i in range(0, layer_definition.GetFieldCount())]
 
+            if self.columns is not None:
+                self.fields = [field for field in self.fields if field.GetName() in self.columns]
+
             # if the vector should be initialized in some other spatial reference
             if dest_spref is not None:
-                transform_tool = osr.CoordinateTransformation(self.spref,
-                                                              dest_spref)
+                self.transform_tool = SpatialRefCache.get_transform(self.spref,
+                                                                    dest_spref)
                 self.spref = dest_spref
-            else:
-                transform_tool = None
-
-            # iterate thru features and append to list
-            feat = self.layer.GetNextFeature()
 
-            feat_count = 0
-            while feat:
+            if lazy:
                 if feat_limit is not None:
-                    if feat_count >= feat_limit:
-                        break
+                    self.nfeat = min(self.nfeat, feat_limit)
 
-                # extract feature attributes
-                all_items = feat.items()
-
-                # and feature geometry feature string
-                geom = feat.GetGeometryRef()
+                if verbose:
+                    sys.stdout.write("\nOpened Vector {} of type {} ".format(self.name,
+                                                                            self.ogr_geom_type(self.type)) +
+                                     "with {} feature(s) for lazy reading\n\n".format(str(self.nfeat)))
+                return
 
-                # close rings if polygon
-                if geom_type == 3:
-                    geom.CloseRings()
+            # attribute records share one tuple of field names
+            attr_names = tuple(field.GetName() for field in self.fields)
+            attr_index = list(layer_definition.GetFieldIndex(name) for name in attr_names)
 
-                # convert to another projection and write new features
-                if dest_spref is not None:
-                    geom.Transform(transform_tool)
+            # iterate thru features and append to list
+            for feat_count, new_feat in enumerate(self._read_layer()):
 
-                    new_feat = ogr.Feature(layer_definition)
-                    for attr, val in all_items.items():
-                        new_feat.SetField(attr, val)
-                    new_feat.SetGeometry(geom)
-                else:
-                    new_feat = feat
+                # extract feature attributes
+                all_items = AttributeRecord.from_feature(new_feat, attr_names, attr_index)
 
                 if verbose:
-                    attr_dict = json.dumps(all_items)
+                    attr_dict = json.dumps(all_items.to_dict())
                     sys.stdout.write('Feature {} of {} : attr {}\n'.format(str(feat_count+1),
                                                                            str(self.nfeat),
                                                                            attr_dict))
 
                 self.attributes.append(all_items)
-                self.features.append(new_feat)
-                self.wktlist.append(geom.ExportToWkt())
-                feat_count += 1
+                self.geometries.append(new_feat.GetGeometryRef())
+
+                if keep_features:
+                    self.features.append(new_feat)
 
-                feat = self.layer.GetNextFeature()
+            self.nfeat = len(self.geometries)
 
-            self.nfeat = len(self.features)
+            # spatial index is persisted only for vectors that match the file contents
+            if feat_limit is None and dest_spref is None and not self.is_filtered:
+                self.index_file = self.filename + '.sidx.npz'
 
             if verbose:
                 sys.stdout.write("\nInitialized Vector {} of type {} ".format(self.name,
@@ -168,15 +213,12 @@ class Vector(object):
                 self.datasource = out_datasource
 
                 if self.spref_str is not None:
-                    self.spref = osr.SpatialReference()
-                    res = self.spref.ImportFromWkt(spref_str)
+                    self.spref = SpatialRefCache.get_spref(spref_str, 'wkt')
                 elif self.epsg is not None:
-                    self.spref = osr.SpatialReference()
-                    res = self.spref.ImportFromEPSG(self.epsg)
+                    self.spref = SpatialRefCache.get_spref(self.epsg, 'epsg')
                     self.spref_str = self.spref.ExportToWkt()
                 elif self.proj4 is not None:
-                    self.spref = osr.SpatialReference()
-                    res = self.spref.ImportFromEPSG(self.proj4)
+                    self.spref = SpatialRefCache.get_spref(self.proj4, 'proj4')
                     self.spref_str = self.spref.ExportToWkt()
                 else:
                     raise ValueError("No spatial reference provided")
@@ -190,7 +232,7 @@ class Vector(object):
                         temp_attr = ogr.FieldDefn(attr_name, OGR_FIELD_DEF[attr_type])
                         if attr_type == 'str':
                             temp_attr.SetWidth(self.width)
-                        if attr_type in ('float', 'int'):
+                        if attr_type in ('float', 'int', 'int64'):
                             temp_attr.SetPrecision(self.precision)
 
                         self.layer.CreateField(temp_attr)
@@ -205,6 +247,266 @@ class Vector(object):
             if verbose:
                 sys.stdout.write("\nInitialized empty Vector\n")
 
+    def set_filter(self,
+                   where=None,
+                   bbox=None,
+                   mask_geom=None,
+                   columns=None,
+                   layer=None):
+        """
+        Method to set attribute and spatial filters and the field selection on the OGR layer.
+        Filters apply to all subsequent reads from the layer (e.g. iter_features on lazy vectors);
+        calling this method without arguments removes all filters.
+        :param where: OGR SQL attribute filter string (default: None)
+        :param bbox: Bounding box (xmin, xmax, ymin, ymax) in the layer spatial reference (default: None)
+        :param mask_geom: OGR geometry or WKT string in the layer spatial reference (default: None)
+        :param columns: List of field names to read (default: all fields)
+        :param layer: OGR layer to set the filters on (default: self.layer)
+        :return: None
+        """
+        if layer is None:
+            layer = self.layer
+
+        if layer.SetAttributeFilter(where) != 0:
+            raise ValueError('Invalid attribute filter: {}'.format(where))
+
+        if mask_geom is not None:
+            if type(mask_geom) == str:
+                mask_geom = ogr.CreateGeometryFromWkt(mask_geom)
+            layer.SetSpatialFilter(mask_geom)
+        elif bbox is not None:
+            layer.SetSpatialFilterRect(bbox[0], bbox[2], bbox[1], bbox[3])
+        else:
+            layer.SetSpatialFilter(None)
+
+        layer_definition = layer.GetLayerDefn()
+        field_names = list(layer_definition.GetFieldDefn(i).GetName()
+                           for i in range(layer_definition.GetFieldCount()))
+
+        if columns is not None:
+            missing = list(name for name in columns if name not in field_names)
+            if len(missing) > 0:
+                raise ValueError('Field(s) not found in layer: {}'.format(', '.join(missing)))
+
+            layer.SetIgnoredFields(list(name for name in field_names if name not in columns))
+            columns = list(columns)
+        else:
+            layer.SetIgnoredFields([])
+
+        self.where = where
+        self.bbox = bbox
+        self.mask_geom = mask_geom
+        self.columns = columns
+
+        # cached point coordinates no longer match the filtered features
+        self.coords = None
+
+        if layer is self.layer and self.lazy:
+            self.nfeat = layer.GetFeatureCount()
+            if self.feat_limit is not None:
+                self.nfeat = min(self.nfeat, self.feat_limit)
+
+    @property
+    def is_filtered(self):
+        """
+        If an attribute or spatial filter or a field selection is set on the layer
+        """
+        return self.where is not None or self.bbox is not None or \
+            self.mask_geom is not None or self.columns is not None
+
+    def _feature_items(self,
+                       feat):
+        """
+        Method to get the attribute dictionary of a feature, limited to the selected columns
+        :param feat: OGR feature
+        :return: Dictionary
+        """
+        if self.columns is None:
+            return feat.items()
+        return dict((name, feat.GetField(name)) for name in self.columns)
+
+    def _read_layer(self):
+        """
+        Generator to read features from the layer, closing polygon rings and
+        transforming geometries to the vector spatial reference where needed
+        :return: Yields OGR feature
+        """
+        layer_definition = self.layer.GetLayerDefn()
+
+        self.layer.ResetReading()
+        feat = self.layer.GetNextFeature()
+
+        feat_count = 0
+        while feat:
+            if self.feat_limit is not None:
+                if feat_count >= self.feat_limit:
+                    break
+
+            # feature geometry
+            geom = feat.GetGeometryRef()
+
+            if geom is not None:
+                # close rings if polygon
+                if self.close_rings:
+                    geom.CloseRings()
+
+                # convert to another projection and write new features
+                if self.transform_tool is not None:
+                    geom.Transform(self.transform_tool)
+
+                    new_feat = ogr.Feature(layer_definition)
+                    for attr, val in feat.items().items():
+                        new_feat.SetField(attr, val)
+                    new_feat.SetGeometry(geom)
+                    feat = new_feat
+
+            yield feat
+            feat_count += 1
+
+            feat = self.layer.GetNextFeature()
+
+    @staticmethod
+    def _batch(iterator,
+               batch_size=None):
+        """
+        Generator to group the items of an iterator in lists
+        :param iterator: Any iterator
+        :param batch_size: Number of items per list (default: None, items are yielded one at a time)
+        :return: Yields item or list of items
+        """
+        if batch_size is None:
+            for item in iterator:
+                yield item
+        else:
+            batch = list()
+            for item in iterator:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = list()
+            if len(batch) > 0:
+                yield batch
+
+    def iter_features(self,
+                      batch_size=None):
+        """
+        Generator to iterate over vector features. Lazy vectors read features
+        from the layer on demand, other vectors iterate over the kept OGR features,
+        or over features created from the geometries and attributes.
+        :param batch_size: Number of features per yielded list (default: None, one feature at a time)
+        :return: Yields OGR feature or list of OGR features
+        """
+        if self.lazy:
+            iterator = self._read_layer()
+        elif len(self.features) == len(self.geometries):
+            iterator = iter(self.features)
+        else:
+            iterator = self._make_features()
+
+        return self._batch(iterator, batch_size)
+
+    def _feature_defn(self):
+        """
+        Method to get an OGR feature definition with the fields of the vector
+        :return: OGR FeatureDefn object
+        """
+        feature_defn = ogr.FeatureDefn(self.name)
+        feature_defn.SetGeomType(self.type if self.type is not None else ogr.wkbUnknown)
+
+        for field in self.fields:
+            feature_defn.AddFieldDefn(field)
+
+        return feature_defn
+
+    def _make_features(self):
+        """
+        Generator to create OGR features from the stored geometries and attributes
+        :return: Yields OGR feature
+        """
+        feature_defn = self._feature_defn()
+
+        for i in range(len(self.geometries)):
+            feat = ogr.Feature(feature_defn)
+
+            geom = self.geometries[i]
+            if geom is not None:
+                feat.SetGeometryDirectly(geom)
+
+            if i < len(self.attributes) and self.attributes[i] is not None:
+                for name, value in self.attributes[i].items():
+                    field_index = feature_defn.GetFieldIndex(name)
+                    if field_index >= 0 and value is not None:
+                        feat.SetField(field_index, value)
+
+            yield feat
+
+    def iter_attributes(self,
+                        batch_size=None):
+        """
+        Generator to iterate over feature attribute dictionaries
+        :param batch_size: Number of dictionaries per yielded list (default: None, one at a time)
+        :return: Yields dictionary or list of dictionaries
+        """
+        if self.lazy:
+            iterator = (self._feature_items(feat) for feat in self._read_layer())
+        else:
+            iterator = iter(self.attributes)
+
+        return self._batch(iterator, batch_size)
+
+    def iter_geometries(self,
+                        batch_size=None):
+        """
+        Generator to iterate over feature geometries
+        :param batch_size: Number of geometries per yielded list (default: None, one at a time)
+        :return: Yields OGR geometry or list of OGR geometries
+        """
+        if self.lazy:
+            iterator = (feat.GetGeometryRef().Clone() if feat.GetGeometryRef() is not None else None
+                        for feat in self._read_layer())
+        else:
+            iterator = iter(self.geometries)
+
+        return self._batch(iterator, batch_size)
+
+    @property
+    def wktlist(self):
+        """
+        WKT strings of the feature geometries, created from the stored WKB on first request
+        and cached until the geometries change. The tuple is read-only: assign a new list
+        of WKT strings to replace the geometries, or use add_feat() to add features.
+        :return: Tuple of WKT strings
+        """
+        cache = getattr(self, '_wkt_cache', None)
+
+        if cache is None or cache[0] is not self.geometries or cache[1] != len(self.geometries):
+            cache = (self.geometries, len(self.geometries), tuple(self.geometries.wkt_list()))
+            self._wkt_cache = cache
+
+        return cache[2]
+
+    @wktlist.setter
+    def wktlist(self, wkt_list):
+        self.geometries = GeometryStore.from_wkt(wkt_list)
+        self.nfeat = len(self.geometries)
+
+        # OGR features and everything derived from the old geometries are stale
+        self.features = list()
+        self._reset_geometry_caches()
+
+    def _reset_geometry_caches(self):
+        """
+        Method to drop everything derived from the geometries: the spatial index, simplified and
+        coarse geometries, prepared geometries and cached point coordinates
+        :return: None
+        """
+        self.spatial_index = None
+        self.index_file = None
+        self.simplified = dict()
+        self._coarse = None
+        self._prepared = None
+        self.coords = None
+
     def __repr__(self):
         return "<Vector {} of type {} ".format(self.name,
                                                str(self.type)) + \
@@ -219,6 +521,8 @@ class Vector(object):
         :return: OGR data type
         """
         val = type(x).__name__.lower()
+        if val in ('int', 'long') and not (-2 ** 31 <= x < 2 ** 31):
+            val = 'int64'
         try:
             return OGR_FIELD_DEF[val]
         except (KeyError, NameError):
@@ -255,21 +559,7 @@ class Vector(object):
         :param x: input item
         :return: string
         """
-        if type(x).__name__ != 'str':
-            return Vector.ogr_data_type(x)
-        else:
-            try:
-                val = int(x)
-            except ValueError:
-                try:
-                    val = float(x)
-                except ValueError:
-                    try:
-                        val = str(x)
-                    except:
-                        val = None
-
-            return Vector.ogr_data_type(val)
+        return Vector.ogr_data_type(Handler.string_to_type(x))
 
     @staticmethod
     def wkt_from_coords(coords,
@@ -361,8 +651,14 @@ class Vector(object):
                 feat.SetField(primary_key, self.nfeat)
 
         self.layer.CreateFeature(feat)
-        self.features.append(feat)
-        self.wktlist.append(geom.ExportToWkt())
+
+        # OGR features are only kept if the vector keeps one per geometry
+        if len(self.features) == len(self.geometries):
+            self.features.append(feat)
+
+        self.geometries.append(geom)
+        self._reset_geometry_caches()
+
         if attr is not None:
             if primary_key is not None:
                 attr.update({primary_key: self.nfeat})
@@ -384,7 +680,7 @@ class Vector(object):
         :return: None
         """
 
-        for i, feat in enumerate(vector.features):
+        for feat in vector.iter_features():
             geom = feat.GetGeometryRef()
             attr = feat.items()
 
@@ -397,81 +693,1182 @@ class Vector(object):
         if remove:
             vector = None
 
+    @staticmethod
+    def _merge_field_type(type1,
+                          type2):
+        """
+        Method to get a field type that can hold values of two field types
+        :param type1: OGR field type
+        :param type2: OGR field type
+        :return: OGR field type
+        """
+        if type1 == type2:
+            return type1
+
+        numeric = (ogr.OFTInteger, ogr.OFTInteger64, ogr.OFTReal)
+
+        if type1 in numeric and type2 in numeric:
+            if ogr.OFTReal in (type1, type2):
+                return ogr.OFTReal
+            return ogr.OFTInteger64
+
+        return ogr.OFTString
+
+    @classmethod
+    def concat(cls,
+               filenames,
+               outfile,
+               spref_str=None,
+               source_field=None,
+               batch_size=50000,
+               nreaders=1,
+               spatial_index=True,
+               verbose=False):
+        """
+        Method to merge many vector files into one output file without loading them in memory.
+        Schemas are reconciled by field name (conflicting types are widened to Integer64, Real or String),
+        geometries are reprojected to the output spatial reference where needed, and single geometries
+        are promoted to multi-geometries when the inputs mix them. Features are streamed from the inputs
+        and written in batched transactions; with nreaders > 1 inputs are read on parallel threads.
+        :param filenames: List of vector file names
+        :param outfile: Output file name (.shp, .json/.geojson, .csv, .gpkg, .fgb)
+        :param spref_str: WKT string of the output spatial reference (default: that of the first file)
+        :param source_field: Name of a field to store the input file name in (default: None)
+        :param batch_size: Number of features per batch and transaction
+        :param nreaders: Number of parallel reader threads (default: 1, read files in order)
+        :param spatial_index: If a spatial index should be created for the output file
+        :param verbose: If the steps should be displayed
+        :return: Number of features written
+        """
+        import threading
+        try:
+            from queue import Queue, Full, Empty
+        except ImportError:
+            from Queue import Queue, Full, Empty
+
+        if len(filenames) == 0:
+            raise ValueError('No input files')
+
+        # first pass: layer definitions only
+        field_types = dict()
+        field_widths = dict()
+        field_names = list()
+        geom_types = set()
+        sprefs = list()
+
+        for filename in filenames:
+            datasource = ogr.Open(filename)
+            if datasource is None:
+                raise ValueError('Unable to open {}'.format(filename))
+            layer = datasource.GetLayerByIndex(0)
+            layer_defn = layer.GetLayerDefn()
+
+            for i in range(layer_defn.GetFieldCount()):
+                field_defn = layer_defn.GetFieldDefn(i)
+                name = field_defn.GetName()
+
+                if name not in field_types:
+                    field_names.append(name)
+                    field_types[name] = field_defn.GetType()
+                    field_widths[name] = field_defn.GetWidth()
+                else:
+                    field_types[name] = cls._merge_field_type(field_types[name], field_defn.GetType())
+                    field_widths[name] = max(field_widths[name], field_defn.GetWidth())
+
+            geom_types.add(ogr.GT_Flatten(layer.GetGeomType()))
+
+            spref = layer.GetSpatialRef()
+            sprefs.append(spref.ExportToWkt() if spref is not None else None)
+
+            datasource = None
+
+        if spref_str is None:
+            spref_str = sprefs[0]
+
+        out_spref = None
+        if spref_str is not None:
+            out_spref = SpatialRefCache.get_spref(spref_str, 'wkt')
+
+        geom_types.discard(ogr.wkbUnknown)
+
+        if len(geom_types) == 1:
+            out_type = list(geom_types)[0]
+        elif len(geom_types) == 2 and max(geom_types) - min(geom_types) == 3 and min(geom_types) in (1, 2, 3):
+            out_type = max(geom_types)
+        else:
+            out_type = ogr.wkbUnknown
+
+        promote = out_type in (4, 5, 6)
+
+        # output layer
+        driver_type = cls.get_driver_name(outfile)
+        layer_name = os.path.basename(outfile).split('.')[0]
+
+        layer_options = list()
+        if driver_type in ('GPKG', 'FlatGeobuf'):
+            layer_options.append('SPATIAL_INDEX={}'.format('YES' if spatial_index else 'NO'))
+
+        out_driver = ogr.GetDriverByName(driver_type)
+
+        if os.path.isfile(outfile):
+            out_driver.DeleteDataSource(outfile)
+
+        out_datasource = out_driver.CreateDataSource(outfile)
+        out_layer = out_datasource.CreateLayer(layer_name,
+                                               srs=out_spref,
+                                               geom_type=out_type,
+                                               options=layer_options)
+
+        for name in field_names:
+            field_defn = ogr.FieldDefn(name, field_types[name])
+            if field_widths[name] > 0 and field_types[name] == ogr.OFTString:
+                field_defn.SetWidth(field_widths[name])
+            out_layer.CreateField(field_defn)
+
+        if source_field is not None:
+            field_defn = ogr.FieldDefn(source_field, ogr.OFTString)
+            field_defn.SetWidth(max(len(os.path.basename(filename)) for filename in filenames))
+            out_layer.CreateField(field_defn)
+
+        out_layer_defn = out_layer.GetLayerDefn()
+        source_index = out_layer_defn.GetFieldIndex(source_field) if source_field is not None else -1
+
+        def read_file(file_index, queue):
+            """
+            Read one input file in batches of features with geometries in the output
+            spatial reference and type. Puts (file index, batch) tuples in the queue,
+            then (file index, None), or (file index, exception) on error.
+            Stops early if the merge is stopped.
+            """
+            try:
+                datasource = ogr.Open(filenames[file_index])
+                layer = datasource.GetLayerByIndex(0)
+
+                transform_tool = None
+                in_spref = layer.GetSpatialRef()
+                if in_spref is not None and out_spref is not None and in_spref.IsSame(out_spref) != 1:
+                    transform_tool = SpatialRefCache.get_transform(in_spref, out_spref)
+
+                batch = list()
+                feat = layer.GetNextFeature()
+
+                while feat and not stop.is_set():
+                    geom = feat.GetGeometryRef()
+
+                    if geom is not None:
+                        if transform_tool is not None:
+                            geom.Transform(transform_tool)
+                        if promote and ogr.GT_Flatten(geom.GetGeometryType()) == out_type - 3:
+                            feat.SetGeometryDirectly(ogr.ForceTo(geom.Clone(), out_type))
+
+                    batch.append(feat)
+
+                    if len(batch) == batch_size:
+                        if not put((file_index, batch)):
+                            return
+                        batch = list()
+
+                    feat = layer.GetNextFeature()
+
+                if len(batch) > 0:
+                    if not put((file_index, batch)):
+                        return
+
+                put((file_index, None))
+
+            except Exception as e:
+                put((file_index, e))
+
+        def put(item):
+            """
+            Put an item in the queue, waiting for space unless the merge is stopped.
+            Returns False if the merge was stopped.
+            """
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        # at most two batches per reader are held in memory
+        queue = Queue(maxsize=2 * max(1, nreaders))
+        stop = threading.Event()
+
+        field_maps = dict()
+        next_file = [0]
+        lock = threading.Lock()
+
+        def reader():
+            while True:
+                with lock:
+                    file_index = next_file[0]
+                    next_file[0] += 1
+                if file_index >= len(filenames) or stop.is_set():
+                    return
+                read_file(file_index, queue)
+
+        threads = list(threading.Thread(target=reader) for _ in range(max(1, nreaders)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        count = 0
+        nfinished = 0
+
+        completed = False
+
+        try:
+            while nfinished < len(filenames):
+                file_index, batch = queue.get()
+
+                if batch is None:
+                    nfinished += 1
+                    if verbose:
+                        Opt.cprint('Merged {} ({} of {})'.format(filenames[file_index],
+                                                                str(nfinished),
+                                                                str(len(filenames))))
+                    continue
+
+                if isinstance(batch, Exception):
+                    raise batch
+
+                if file_index not in field_maps:
+                    in_defn = batch[0].GetDefnRef()
+                    field_maps[file_index] = list(out_layer_defn.GetFieldIndex(in_defn.GetFieldDefn(i).GetName())
+                                                  for i in range(in_defn.GetFieldCount()))
+
+                if source_index >= 0:
+                    source_name = os.path.basename(filenames[file_index])
+                    features = list()
+                    for feat in batch:
+                        out_feat = ogr.Feature(out_layer_defn)
+                        out_feat.SetFromWithMap(feat, 1, field_maps[file_index])
+                        out_feat.SetField(source_index, source_name)
+                        features.append(out_feat)
+                    field_map = list(range(out_layer_defn.GetFieldCount()))
+                else:
+                    features = batch
+                    field_map = field_maps[file_index]
+
+                count += cls.write_features(out_layer,
+                                            features,
+                                            batch_size=batch_size,
+                                            field_map=field_map)
+
+            completed = True
+
+        finally:
+            # unblock and stop the readers, then remove the partial output on error
+            stop.set()
+            try:
+                while True:
+                    queue.get_nowait()
+            except Empty:
+                pass
+
+            for thread in threads:
+                thread.join()
+
+            if not completed:
+                out_layer = out_datasource = None
+                if os.path.isfile(outfile):
+                    out_driver.DeleteDataSource(outfile)
+
+        if spatial_index and count > 0 and driver_type == 'ESRI Shapefile':
+            out_datasource.ExecuteSQL('CREATE SPATIAL INDEX ON "{}"'.format(out_layer.GetName()))
+
+        out_layer = None
+        out_datasource = out_driver = None
+
+        return count
+
+    @staticmethod
+    def get_driver_name(filename):
+        """
+        Method to get the OGR driver name for a vector file from its extension
+        :param filename: File name
+        :return: OGR driver name
+        """
+        ext = os.path.basename(filename).split('.')[-1].lower()
+
+        if ext in ('json', 'geojson'):
+            return 'GeoJSON'
+        elif ext == 'csv':
+            return 'CSV'
+        elif ext == 'gpkg':
+            return 'GPKG'
+        elif ext == 'fgb':
+            return 'FlatGeobuf'
+        else:
+            return 'ESRI Shapefile'
+
+    @staticmethod
+    def field_map(src_defn,
+                  out_defn):
+        """
+        Method to map the fields of source features to the fields of an output layer by name,
+        for use with OGR Feature.SetFromWithMap
+        :param src_defn: OGR feature definition of the source features
+        :param out_defn: OGR feature definition of the output layer
+        :return: List of output field indices, one per source field (-1 for fields not in the output)
+        """
+        return list(out_defn.GetFieldIndex(src_defn.GetFieldDefn(i).GetName())
+                    for i in range(src_defn.GetFieldCount()))
+
+    @staticmethod
+    def write_features(layer,
+                       features,
+                       batch_size=50000,
+                       field_map=None):
+        """
+        Method to write features to a layer in batched transactions
+        :param layer: OGR layer to write to
+        :param features: Iterable of OGR features or (OGR geometry, attribute dictionary) tuples;
+                         attributes not in the layer are skipped
+        :param batch_size: Number of features per transaction
+        :param field_map: List mapping source feature field indices to layer field indices
+                          (default: fields are matched by name)
+        :return: Number of features written
+        """
+        layer_defn = layer.GetLayerDefn()
+
+        count = 0
+        layer.StartTransaction()
+
+        for item in features:
+            feat = ogr.Feature(layer_defn)
+
+            if isinstance(item, ogr.Feature):
+                if field_map is not None and item.GetFieldCount() == len(field_map):
+                    feat.SetFromWithMap(item, 1, field_map)
+                else:
+                    feat.SetFrom(item)
+            else:
+                geom, attr = item
+                feat.SetGeometry(geom)
+                if attr is not None:
+                    for key, val in attr.items():
+                        field_index = layer_defn.GetFieldIndex(key)
+                        if field_index >= 0 and val is not None:
+                            feat.SetField(field_index, val)
+
+            layer.CreateFeature(feat)
+            count += 1
+
+            if count % batch_size == 0:
+                layer.CommitTransaction()
+                layer.StartTransaction()
+
+        layer.CommitTransaction()
+
+        return count
+
     def write_vector(self,
                      outfile=None,
-                     in_memory=False):
+                     in_memory=False,
+                     batch_size=50000,
+                     spatial_index=True):
         """
         Method to write the vector object to memory or to file
+        Supported formats by file extension: .shp (default), .json/.geojson, .csv, .gpkg, .fgb
+        Features are written in batched transactions and a spatial index is created for
+        the formats that support it.
         :param outfile: File to write the vector object to
         :param in_memory: If the vector object should be written in memory (default: False)
+        :param batch_size: Number of features written per transaction
+        :param spatial_index: If a spatial index should be created for the output file
         :return: Vector object if written to memory else NoneType
         """
 
-        if in_memory:
+        if in_memory:
+
+            driver_type = 'Memory'
+
+            if outfile is not None:
+                outfile = os.path.basename(outfile).split('.')[0]
+            else:
+                outfile = 'in_memory'
+
+            out_driver = ogr.GetDriverByName(driver_type)
+            out_datasource = out_driver.CreateDataSource(outfile)
+            out_layer = out_datasource.CopyLayer(self.layer, outfile)
+
+            out_vector = Vector()
+
+            out_vector.datasource = out_datasource
+            out_vector.mem_source = out_datasource
+
+            return out_vector
+
+        else:
+
+            if outfile is None:
+                outfile = self.filename
+                if self.filename is None:
+                    raise ValueError("No filename for output")
+
+            driver_type = self.get_driver_name(outfile)
+            layer_name = os.path.basename(outfile).split('.')[0]
+
+            layer_options = list()
+            if driver_type in ('GPKG', 'FlatGeobuf'):
+                layer_options.append('SPATIAL_INDEX={}'.format('YES' if spatial_index else 'NO'))
+
+            out_driver = ogr.GetDriverByName(driver_type)
+
+            if os.path.isfile(outfile):
+                out_driver.DeleteDataSource(outfile)
+
+            out_datasource = out_driver.CreateDataSource(outfile)
+
+            out_layer = out_datasource.CreateLayer(layer_name,
+                                                   srs=self.spref,
+                                                   geom_type=self.type,
+                                                   options=layer_options)
+
+            for field in self.fields:
+                out_layer.CreateField(field)
+
+            # fields are matched by name; features are written from the current geometries and
+            # attributes so edits to them are not lost
+            if self.lazy:
+                features = self.iter_features()
+            else:
+                features = ((self.geometries[i], self.attributes[i] if i < len(self.attributes) else None)
+                            for i in range(len(self.geometries)))
+
+            count = self.write_features(out_layer,
+                                        features,
+                                        batch_size=batch_size)
+
+            if count == 0:
+                sys.stdout.write('No features found... closing file.\n')
+
+            elif spatial_index and driver_type == 'ESRI Shapefile':
+                out_datasource.ExecuteSQL('CREATE SPATIAL INDEX ON "{}"'.format(out_layer.GetName()))
+
+            out_layer = None
+            out_datasource = out_driver = None
+
+    def compact_attributes(self):
+        """
+        Method to convert attribute dictionaries of the vector (e.g. added with add_feat) to compact
+        AttributeRecord objects that share one tuple of field names, to reduce memory use of large vectors.
+        Vectors read from a file already hold AttributeRecord objects. Records behave as mappings (item access, get, keys, values, items, update) but are not dicts;
+        use record.to_dict() where a dict is needed (e.g. json.dumps).
+        :return: None
+        """
+        names = tuple(field.GetName() for field in self.fields)
+
+        if self.columns is not None:
+            names = tuple(name for name in names if name in self.columns)
+
+        self.attributes = list(attr if isinstance(attr, AttributeRecord)
+                               else AttributeRecord.from_dict(attr, names)
+                               for attr in self.attributes)
+
+    def memory_usage(self,
+                     verbose=False):
+        """
+        Method to report the memory used by the vector in bytes, by component.
+        Python object sizes are measured with sys.getsizeof; the native memory of OGR
+        features and geometries is not visible to Python and is estimated from the
+        WKB size of the geometries and the number of fields.
+        :param verbose: If the report should be displayed
+        :return: Dictionary with keys 'geometries', 'attributes', 'ogr_features',
+                 'spatial_index', 'simplified', 'total'
+        """
+        usage = dict()
+
+        usage['geometries'] = self.geometries.nbytes
+
+        attributes = sys.getsizeof(self.attributes)
+        shared_names = set()
+        for attr in self.attributes:
+            if isinstance(attr, AttributeRecord):
+                attributes += attr.nbytes
+                if id(attr._names) not in shared_names:
+                    shared_names.add(id(attr._names))
+                    attributes += sys.getsizeof(attr._names)
+            else:
+                attributes += sys.getsizeof(attr) + sum(sys.getsizeof(value) for value in attr.values())
+        usage['attributes'] = attributes
+
+        nfields = len(self.fields)
+        ogr_features = sys.getsizeof(self.features)
+        for i, feat in enumerate(self.features):
+            ogr_features += sys.getsizeof(feat) + 64 + 16 * nfields
+            if i < len(self.geometries):
+                ogr_features += len(self.geometries.wkb(i))
+        usage['ogr_features'] = ogr_features
+
+        if self.spatial_index is not None:
+            usage['spatial_index'] = self.spatial_index.bounds.nbytes + self.spatial_index.order.nbytes + \
+                self.spatial_index.leaf_bounds.nbytes
+        else:
+            usage['spatial_index'] = 0
+
+        usage['simplified'] = sum(store.nbytes for store in self.simplified.values())
+
+        usage['total'] = sum(usage.values())
+
+        if verbose:
+            for key in ('geometries', 'attributes', 'ogr_features', 'spatial_index', 'simplified', 'total'):
+                Opt.cprint('{}: {:.2f} MB'.format(key, usage[key] / (1024.0 * 1024.0)))
+
+        return usage
+
+    def get_attribute_table(self,
+                            columns=None):
+        """
+        Method to get the feature attributes as a columnar AttributeTable.
+        The table is read directly from the OGR layer when it holds the same features as the vector.
+        :param columns: List of field names (default: all fields, or the columns read at load time)
+        :return: AttributeTable object
+        """
+        if columns is None:
+            columns = self.columns
+
+        if self.layer is not None and (self.lazy or self.feat_limit is None) and \
+                self.layer.GetFeatureCount() == self.nfeat:
+            return AttributeTable.from_layer(self.layer,
+                                             columns=columns)
+        else:
+            return AttributeTable.from_dicts(self.attributes,
+                                             columns=columns)
+
+    def get_bounds_array(self):
+        """
+        Method to get the bounding boxes of all features
+        :return: Numpy array of shape (nfeat, 4) with (xmin, xmax, ymin, ymax) per feature
+        """
+        bounds = list(feat.GetGeometryRef().GetEnvelope() if feat.GetGeometryRef() is not None
+                      else (np.inf, -np.inf, np.inf, -np.inf)
+                      for feat in self.iter_features())
+
+        return np.array(bounds, dtype=np.float64).reshape(-1, 4)
+
+    def get_spatial_index(self,
+                          persist=True):
+        """
+        Method to get the spatial index of the vector features, building it on first use.
+        For vectors read from a file, the index is saved next to the file (<filename>.sidx.npz)
+        and reused as long as the file is not modified. Lazy vectors are read once to build the index.
+        :param persist: If the index should be read from or saved to the index file
+        :return: SpatialIndex object
+        """
+        if self.spatial_index is not None and len(self.spatial_index) == self.nfeat:
+            return self.spatial_index
+
+        index_file = self.index_file if persist else None
+
+        if index_file is not None:
+            mtime = os.path.getmtime(self.filename)
+            self.spatial_index = SpatialIndex.from_file(index_file,
+                                                        mtime=mtime,
+                                                        nfeat=self.nfeat)
+
+        if self.spatial_index is None or len(self.spatial_index) != self.nfeat:
+            self.spatial_index = SpatialIndex(self.get_bounds_array())
+
+            if index_file is not None:
+                try:
+                    self.spatial_index.save(index_file,
+                                            mtime=mtime,
+                                            nfeat=self.nfeat)
+                except (IOError, OSError):
+                    pass
+
+        return self.spatial_index
+
+    def intersecting_pairs(self,
+                           query_vector,
+                           exact=True,
+                           tolerance=None):
+        """
+        Method to find pairs of intersecting features between a query vector and self.
+        Candidate pairs are found with the spatial index of self, and the exact
+        intersection test is only run on pairs with overlapping bounding boxes.
+        If simplified geometries of self are available (see simplify()), they are used as a coarse stage:
+        simplified geometries are within the tolerance of the original, so pairs not intersecting the
+        simplified geometry buffered by the tolerance are rejected, pairs intersecting the simplified
+        polygon shrunk by the tolerance are accepted, and only the rest are tested on the exact geometry.
+        :param query_vector: Vector object in the same spatial reference as self
+        :param exact: If the exact geometry intersection test should be run on candidate pairs
+        :param tolerance: Tolerance of the simplified geometries to use in the coarse stage
+                          (default: self.coarse_tolerance, None to skip the coarse stage)
+        :return: Tuple of numpy arrays (query feature indices, self feature indices)
+        """
+        query_index, self_index = self.get_spatial_index().query_bulk(query_vector.get_bounds_array())
+
+        if tolerance is None:
+            tolerance = self.coarse_tolerance
+
+        if exact and query_index.shape[0] > 0:
+            keep = np.zeros(query_index.shape[0], dtype=bool)
+
+            query_geoms = query_vector._indexed_geometries()
+            self_geoms = self._indexed_geometries()
+
+            # simplified geometries are only available for loaded features
+            if tolerance is not None and not self.lazy:
+                outer, inner = self._coarse_geometries(tolerance)
+            else:
+                outer = inner = None
+
+            for k, (j, i) in enumerate(zip(query_index.tolist(), self_index.tolist())):
+                query_geom = query_geoms[j]
+
+                if outer is not None:
+                    outer_geom, inner_geom = outer.get(i), inner.get(i)
+
+                    if outer_geom is None:
+                        outer_geom, inner_geom = self._coarse_geometry(i, tolerance)
+                        outer[i], inner[i] = outer_geom, inner_geom
+
+                    if outer_geom is not None and not outer_geom.Intersects(query_geom):
+                        continue
+
+                    if inner_geom is not None and not inner_geom.IsEmpty() and inner_geom.Intersects(query_geom):
+                        keep[k] = True
+                        continue
+
+                keep[k] = self_geoms[i] is not None and query_geom is not None and \
+                    self_geoms[i].Intersects(query_geom)
+
+            query_index, self_index = query_index[keep], self_index[keep]
+
+        return query_index, self_index
+
+    def _indexed_geometries(self):
+        """
+        Method to get the feature geometries indexable by feature index; lazy vectors are read once
+        :return: List of OGR geometries or GeometryStore object
+        """
+        if self.lazy:
+            return GeometryStore(self.iter_geometries())
+
+        return self.geometries
+
+    def _coarse_geometries(self,
+                           tolerance):
+        """
+        Method to get the caches of outer (buffered) and inner (shrunk) simplified geometries
+        :param tolerance: Simplification tolerance
+        :return: Tuple of dictionaries {feature index: OGR geometry}
+        """
+        if getattr(self, '_coarse', None) is None or self._coarse[0] != tolerance:
+            self._coarse = (tolerance, dict(), dict())
+
+        return self._coarse[1], self._coarse[2]
+
+    def _coarse_geometry(self,
+                         i,
+                         tolerance):
+        """
+        Method to make the outer and inner coarse geometries of a feature from its simplified geometry
+        :param i: Feature index
+        :param tolerance: Simplification tolerance
+        :return: Tuple of OGR geometries (outer, inner); inner is None for non-polygon geometries
+        """
+        simplified = self.simplified.get((tolerance, True), self.simplified.get((tolerance, False)))
+
+        if simplified is None:
+            simplified = self.get_simplified(tolerance)
+
+        geom = simplified[i]
+
+        if geom is None:
+            return None, None
+
+        # buffer arcs are chords inside the true circle, so the distance is padded to make the
+        # outer geometry contain, and the inner geometry fall within, the exact +/- tolerance buffers
+        quadsecs = 30
+        distance = tolerance / math.cos(math.pi / (4.0 * quadsecs)) * (1.0 + 1e-6)
+
+        outer = geom.Buffer(distance, quadsecs)
+
+        if ogr.GT_Flatten(geom.GetGeometryType()) in (3, 6):
+            inner = geom.Buffer(-distance, quadsecs)
+        else:
+            inner = None
+
+        return outer, inner
+
+    def get_simplified(self,
+                       tolerance,
+                       preserve_topology=True,
+                       batch_size=10000,
+                       nthreads=None,
+                       cache=True):
+        """
+        Method to get simplified geometries of all features, simplifying batches of features in parallel.
+        For vectors read from a file, simplified geometries are saved next to the file
+        (<filename>.simplify_<tolerance>.npz) and reused as long as the file is not modified.
+        :param tolerance: Simplification tolerance in spatial reference units
+        :param preserve_topology: If the topology preserving simplification should be used
+        :param batch_size: Number of features simplified per task
+        :param nthreads: Number of threads (default: number of CPUs)
+        :param cache: If the simplified geometries should be read from or saved to the cache file
+        :return: GeometryStore object with one simplified geometry per feature
+        """
+        key = (tolerance, preserve_topology)
+
+        if key in self.simplified and len(self.simplified[key]) == len(self.geometries):
+            return self.simplified[key]
+
+        if cache and self.index_file is not None:
+            cache_file = '{}.simplify_{}{}.npz'.format(self.filename,
+                                                       repr(float(tolerance)),
+                                                       '' if preserve_topology else '_dp')
+            mtime = os.path.getmtime(self.filename)
+        else:
+            cache_file = mtime = None
+
+        store = None
+        if cache_file is not None:
+            store = GeometryStore.from_file(cache_file,
+                                            mtime=mtime,
+                                            nfeat=len(self.geometries))
+
+        if store is None or len(store) != len(self.geometries):
+
+            def simplify_batch(start):
+                wkb_list = list()
+                for i in range(start, min(start + batch_size, len(self.geometries))):
+                    geom = self.geometries[i]
+                    if geom is None:
+                        wkb_list.append(None)
+                        continue
+                    if preserve_topology:
+                        geom = geom.SimplifyPreserveTopology(tolerance)
+                    else:
+                        geom = geom.Simplify(tolerance)
+                    wkb_list.append(geom.ExportToWkb())
+                return wkb_list
+
+            results = self._map_batches(simplify_batch, len(self.geometries), batch_size, nthreads)
+
+            store = GeometryStore()
+            for wkb_list in results:
+                store.extend(wkb_list)
+
+            if cache_file is not None:
+                try:
+                    store.save(cache_file,
+                               mtime=mtime,
+                               nfeat=len(self.geometries))
+                except (IOError, OSError):
+                    pass
+
+        self.simplified[key] = store
+
+        return store
+
+    def simplify(self,
+                 tolerance,
+                 preserve_topology=True,
+                 batch_size=10000,
+                 nthreads=None,
+                 cache=True,
+                 coarse=True):
+        """
+        Method to make a simplified copy of the vector (see get_simplified()).
+        :param tolerance: Simplification tolerance in spatial reference units
+        :param preserve_topology: If the topology preserving simplification should be used
+        :param batch_size: Number of features simplified per task
+        :param nthreads: Number of threads (default: number of CPUs)
+        :param cache: If the simplified geometries should be read from or saved to the cache file
+        :param coarse: If the simplified geometries should also be used as the coarse stage
+                       of intersection tests on self (see intersecting_pairs())
+        :return: Vector object in memory
+        """
+        store = self.get_simplified(tolerance,
+                                    preserve_topology=preserve_topology,
+                                    batch_size=batch_size,
+                                    nthreads=nthreads,
+                                    cache=cache)
+        if coarse:
+            self.coarse_tolerance = tolerance
+
+        return self._copy_with_geometries(store,
+                                          name=self.name + '_simplified',
+                                          batch_size=batch_size)
+
+    def _copy_with_geometries(self,
+                              store,
+                              name=None,
+                              geom_type=None,
+                              batch_size=50000):
+        """
+        Method to make an in-memory copy of the vector with new geometries and the same attributes
+        :param store: GeometryStore with one geometry per feature
+        :param name: Name of the new vector
+        :param geom_type: OGR geometry type of the new vector (default: type of self)
+        :param batch_size: Number of features per transaction
+        :return: Vector object
+        """
+        vector = Vector()
+        vector.name = name if name is not None else self.name
+        vector.type = geom_type if geom_type is not None else self.type
+        vector.spref = self.spref
+        vector.spref_str = self.spref_str
+        vector.epsg = self.epsg
+        vector.fields = list(self.fields)
+
+        memory_driver = ogr.GetDriverByName('Memory')
+        vector.datasource = memory_driver.CreateDataSource('out')
+        vector.layer = vector.datasource.CreateLayer('temp_layer',
+                                                     srs=self.spref,
+                                                     geom_type=vector.type)
+
+        for field in vector.fields:
+            vector.layer.CreateField(field)
+
+        layer_definition = vector.layer.GetLayerDefn()
+        field_map = None
+
+        vector.layer.StartTransaction()
+
+        for i, feat in enumerate(self.iter_features()):
+            # source features may hold more fields, or fields in another order, than the copy
+            if field_map is None:
+                field_map = self.field_map(feat.GetDefnRef(), layer_definition)
+
+            new_feat = ogr.Feature(layer_definition)
+            new_feat.SetFromWithMap(feat, 1, field_map)
+            new_feat.SetGeometry(store[i])
+
+            vector.layer.CreateFeature(new_feat)
+
+            if self.lazy:
+                vector.attributes.append(self._feature_items(feat))
+
+            if (i + 1) % batch_size == 0:
+                vector.layer.CommitTransaction()
+                vector.layer.StartTransaction()
+
+        vector.layer.CommitTransaction()
+
+        vector.geometries = store
+        if not self.lazy:
+            vector.attributes = list(self.attributes)
+        vector.nfeat = len(store)
+
+        return vector
+
+    @staticmethod
+    def _map_batches(func,
+                     nitems,
+                     batch_size,
+                     nthreads=None):
+        """
+        Method to run a function over batches of items on a thread pool
+        :param func: Function taking the start index of a batch
+        :param nitems: Number of items
+        :param batch_size: Number of items per batch
+        :param nthreads: Number of threads (default: number of CPUs)
+        :return: List of function results in batch order
+        """
+        from multiprocessing.pool import ThreadPool
+        from multiprocessing import cpu_count
+
+        starts = list(range(0, nitems, batch_size))
+
+        if nthreads is None:
+            nthreads = cpu_count()
+        nthreads = max(1, min(int(nthreads), len(starts)))
+
+        if nthreads > 1:
+            pool = ThreadPool(nthreads)
+            try:
+                return pool.map(func, starts)
+            finally:
+                pool.terminate()
+                pool.join()
+
+        return list(func(start) for start in starts)
+
+    def buffer(self,
+               distance,
+               quadsecs=30,
+               batch_size=10000,
+               nthreads=None):
+        """
+        Method to buffer all feature geometries, buffering batches of features in parallel
+        :param distance: Buffer distance in spatial reference units
+        :param quadsecs: Number of segments used to approximate a quarter circle
+        :param batch_size: Number of features buffered per task
+        :param nthreads: Number of threads (default: number of CPUs)
+        :return: Vector object in memory with polygon geometries
+        """
+        geometries = self.geometries if not self.lazy else GeometryStore(self.iter_geometries())
+
+        def buffer_batch(start):
+            wkb_list = list()
+            for i in range(start, min(start + batch_size, len(geometries))):
+                geom = geometries[i]
+                wkb_list.append(geom.Buffer(distance, quadsecs).ExportToWkb() if geom is not None else None)
+            return wkb_list
+
+        store = GeometryStore()
+        for wkb_list in self._map_batches(buffer_batch, len(geometries), batch_size, nthreads):
+            store.extend(wkb_list)
+
+        geom_type = ogr.wkbMultiPolygon if ogr.GT_Flatten(self.type) in (4, 5, 6) else ogr.wkbPolygon
+
+        return self._copy_with_geometries(store,
+                                          name=self.name + '_buffer',
+                                          geom_type=geom_type)
+
+    def within_distance(self,
+                        other,
+                        distance,
+                        return_distance=False,
+                        batch_size=10000,
+                        nthreads=None):
+        """
+        Method to find the features of self (e.g. sample points) within a distance of any feature
+        of another vector (e.g. fire perimeters or roads). Bounding boxes of self are expanded by
+        the distance and queried against the spatial index of the other vector, so distances are
+        only computed for candidate pairs. Batches of features are processed in parallel;
+        with shapely >= 2.0 the distances of each batch are computed in one vectorized call.
+        :param other: Vector object in the same spatial reference as self
+        :param distance: Distance in spatial reference units
+        :param return_distance: If the distance to the nearest feature of other should be returned
+                                instead of a boolean mask (np.inf where no feature is within distance)
+        :param batch_size: Number of features of self per task
+        :param nthreads: Number of threads (default: number of CPUs)
+        :return: Numpy array with one boolean or distance per feature of self
+        """
+        if self.lazy or other.lazy:
+            raise ValueError('Distance queries are not available for lazy vectors')
+
+        other_index = other.get_spatial_index()
+
+        bounds = self.get_bounds_array() + np.array([-distance, distance, -distance, distance])
+
+        try:
+            import shapely
+            if not hasattr(shapely, 'from_wkb'):
+                raise ImportError
+
+            self_geoms = shapely.from_wkb(np.array(list(self.geometries.wkb(i) or None
+                                                        for i in range(len(self.geometries))), dtype=object))
+            other_geoms = shapely.from_wkb(np.array(list(other.geometries.wkb(i) or None
+                                                         for i in range(len(other.geometries))), dtype=object))
+
+            def pair_distance(self_idx, other_idx):
+                return shapely.distance(self_geoms[self_idx], other_geoms[other_idx])
+
+        except ImportError:
+            def pair_distance(self_idx, other_idx):
+                return np.array(list(self.geometries[i].Distance(other.geometries[j])
+                                     for i, j in zip(self_idx.tolist(), other_idx.tolist())),
+                                dtype=np.float64)
+
+        def distance_batch(start):
+            self_idx, other_idx = other_index.query_bulk(bounds[start:start + batch_size])
+            self_idx += start
+
+            nearest = np.full(min(batch_size, bounds.shape[0] - start), np.inf)
+
+            if self_idx.shape[0] > 0:
+                dists = pair_distance(self_idx, other_idx)
+                dists[~(dists <= distance)] = np.inf
+                np.minimum.at(nearest, self_idx - start, dists)
+
+            return nearest
+
+        results = self._map_batches(distance_batch, bounds.shape[0], batch_size, nthreads)
+
+        nearest = np.concatenate(results) if len(results) > 0 else np.zeros(0, dtype=np.float64)
+
+        if return_distance:
+            return nearest
+
+        return np.isfinite(nearest)
+
+    def _point_tester(self,
+                      predicate='within'):
+        """
+        Method to get a function testing points against features of self.
+        Uses vectorized shapely (>= 2.0) tests, prepared shapely geometries, or OGR tests,
+        depending on what is available. Converted geometries are cached on the vector.
+        :param predicate: 'within' (point inside the feature) or 'intersects' (inside or on the boundary)
+        :return: Function (feature index array, x array, y array) -> boolean numpy array
+        """
+        if predicate not in ('within', 'intersects'):
+            raise ValueError('Unsupported predicate: {}'.format(predicate))
+
+        if getattr(self, '_prepared', None) is None:
+            self._prepared = dict()
 
-            driver_type = 'Memory'
+        prepared = self._prepared
 
-            if outfile is not None:
-                outfile = os.path.basename(outfile).split('.')[0]
-            else:
-                outfile = 'in_memory'
+        try:
+            import shapely
+            from shapely import wkb as shapely_wkb
+            from shapely.prepared import prep
+            from shapely.geometry import Point
+        except ImportError:
+            shapely = None
+
+        def get_prepared(i):
+            geom = prepared.get((predicate, i))
+            if geom is None:
+                geom = shapely_wkb.loads(self.geometries.wkb(i))
+                if vectorized:
+                    shapely.prepare(geom)
+                else:
+                    geom = prep(geom)
+                prepared[(predicate, i)] = geom
+            return geom
+
+        if shapely is not None:
+            vectorized = hasattr(shapely, 'contains_xy')
+            xy_test = (shapely.contains_xy if predicate == 'within' else shapely.intersects_xy) \
+                if vectorized else None
+
+            def test_feature(i, x, y):
+                geom = get_prepared(i)
+                if vectorized:
+                    return xy_test(geom, x, y)
+                if predicate == 'within':
+                    return np.array(list(geom.contains(Point(xx, yy)) for xx, yy in zip(x, y)), dtype=bool)
+                return np.array(list(geom.intersects(Point(xx, yy)) for xx, yy in zip(x, y)), dtype=bool)
+        else:
+            def test_feature(i, x, y):
+                geom = self.geometries[i]
+                result = np.zeros(x.shape[0], dtype=bool)
+                for j, (xx, yy) in enumerate(zip(x.tolist(), y.tolist())):
+                    point = ogr.Geometry(ogr.wkbPoint)
+                    point.AddPoint_2D(xx, yy)
+                    result[j] = geom.Contains(point) if predicate == 'within' else geom.Intersects(point)
+                return result
 
-            out_driver = ogr.GetDriverByName(driver_type)
-            out_datasource = out_driver.CreateDataSource(outfile)
-            out_layer = out_datasource.CopyLayer(self.layer, outfile)
+        def tester(feat_index, x, y):
+            result = np.zeros(feat_index.shape[0], dtype=bool)
 
-            out_vector = Vector()
+            if feat_index.shape[0] == 0:
+                return result
 
-            out_vector.datasource = out_datasource
-            out_vector.mem_source = out_datasource
+            # group candidate points by feature so each feature is converted and tested once
+            order = np.argsort(feat_index, kind='mergesort')
+            sorted_index = feat_index[order]
+            uniq, starts = np.unique(sorted_index, return_index=True)
+            ends = np.append(starts[1:], sorted_index.shape[0])
 
-            return out_vector
+            for i, start, end in zip(uniq.tolist(), starts.tolist(), ends.tolist()):
+                pos = order[start:end]
+                result[pos] = test_feature(i, x[pos], y[pos])
 
-        else:
+            return result
 
-            if outfile is None:
-                outfile = self.filename
-                if self.filename is None:
-                    raise ValueError("No filename for output")
+        return tester
 
-            if os.path.basename(outfile).split('.')[-1] == 'json':
-                driver_type = 'GeoJSON'
-            elif os.path.basename(outfile).split('.')[-1] == 'csv':
-                driver_type = 'Comma Separated Value'
-            else:
-                driver_type = 'ESRI Shapefile'
+    @staticmethod
+    def _point_coords(points):
+        """
+        Method to get a coordinate array from a point vector or coordinates
+        :param points: Point Vector object, or array-like of shape (n, 2) with (x, y) coordinates
+        :return: Numpy array of shape (n, 2)
+        """
+        if isinstance(points, Vector):
+            if points.coords is not None and points.coords.shape[0] == points.nfeat:
+                return np.asarray(points.coords, dtype=np.float64)
+
+            return np.array(list((geom.GetX(), geom.GetY()) if geom is not None else (np.nan, np.nan)
+                                 for geom in points.iter_geometries()), dtype=np.float64).reshape(-1, 2)
+
+        return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    def spatial_join(self,
+                     points,
+                     predicate='within',
+                     columns=None,
+                     all_matches=False,
+                     batch_size=100000,
+                     nthreads=None):
+        """
+        Method to find the feature (e.g. fire, ecozone or WRS tile polygon) of self containing each point.
+        Candidate (point, feature) pairs are found by vectorized bounding box tests against the
+        spatial index of self, and only candidate pairs are tested against the prepared feature geometries.
+        Point batches are processed in parallel.
+        :param points: Point Vector object in the same spatial reference as self,
+                       or array-like of shape (n, 2) with (x, y) coordinates
+        :param predicate: 'within' (point inside the feature) or 'intersects' (inside or on the boundary)
+        :param columns: List of attribute names to return for each point instead of feature indices
+        :param all_matches: If all (point, feature) matches should be returned instead of the
+                            first (lowest index) feature per point
+        :param batch_size: Number of points per batch
+        :param nthreads: Number of threads (default: number of CPUs)
+        :return: If all_matches: tuple of numpy arrays (point indices, feature indices).
+                 Otherwise, if columns is None: numpy array of feature indices per point (-1 for no match),
+                 else AttributeTable with the feature attributes per point (NaN or null for no match)
+        """
+        if self.lazy:
+            raise ValueError('Spatial join is not available for lazy vectors')
 
-            out_driver = ogr.GetDriverByName(driver_type)
-            out_datasource = out_driver.CreateDataSource(outfile)
+        coords = self._point_coords(points)
+        npoints = coords.shape[0]
 
-            out_layer = out_datasource.CreateLayer(os.path.basename(outfile).split('.')[0],
-                                                   srs=self.spref,
-                                                   geom_type=self.type)
+        spatial_index = self.get_spatial_index()
+        tester = self._point_tester(predicate)
 
-            for field in self.fields:
-                out_layer.CreateField(field)
+        def join_batch(start):
+            x = coords[start:start + batch_size, 0]
+            y = coords[start:start + batch_size, 1]
 
-            layer_defn = out_layer.GetLayerDefn()
+            point_index, feat_index = spatial_index.query_bulk(np.column_stack([x, x, y, y]))
+            keep = tester(feat_index, x[point_index], y[point_index])
 
-            if len(self.wktlist) > 0:
-                for i, wkt_geom in enumerate(self.wktlist):
-                    geom = ogr.CreateGeometryFromWkt(wkt_geom)
-                    feat = ogr.Feature(layer_defn)
-                    feat.SetGeometry(geom)
+            return point_index[keep] + start, feat_index[keep]
 
-                    for attr, val in self.attributes[i].items():
-                        feat.SetField(attr, val)
+        results = self._map_batches(join_batch, npoints, batch_size, nthreads)
 
-                    out_layer.CreateFeature(feat)
+        if len(results) > 0:
+            point_index = np.concatenate(list(result[0] for result in results))
+            feat_index = np.concatenate(list(result[1] for result in results))
+        else:
+            point_index = feat_index = np.zeros(0, dtype=np.int64)
 
-            elif len(self.features) > 0:
-                for feature in self.features:
-                    out_layer.CreateFeature(feature)
+        if all_matches:
+            return point_index, feat_index
 
-            else:
-                sys.stdout.write('No features found... closing file.\n')
+        # first match per point; pairs are sorted by point index and then by feature index
+        matched = np.full(npoints, -1, dtype=np.int64)
+        if point_index.shape[0] > 0:
+            first = np.append(True, point_index[1:] != point_index[:-1])
+            matched[point_index[first]] = feat_index[first]
 
-            out_datasource = out_driver = None
+        if columns is None:
+            return matched
+
+        table = self.get_attribute_table(columns=columns)
+
+        if len(table) == 0:
+            # no features: every point is unmatched
+            return AttributeTable(columns=OrderedDict((name, np.full(npoints, -1, dtype=np.int32)
+                                                       if name in table.categories
+                                                       else np.full(npoints, np.nan))
+                                                      for name in table.names),
+                                  categories=table.categories)
+
+        out_table = table.filter(np.maximum(matched, 0))
+        unmatched = matched < 0
+
+        if unmatched.any():
+            for name in out_table.names:
+                if name in out_table.categories:
+                    out_table.columns[name] = np.where(unmatched, -1, out_table.columns[name]).astype(np.int32)
+                else:
+                    out_table.columns[name] = np.where(unmatched, np.nan,
+                                                       out_table.columns[name].astype(np.float64))
+
+        return out_table
 
     def get_intersecting_vector(self,
                                 query_vector,
@@ -490,30 +1887,21 @@ class Vector(object):
         # determine if same coordinate system
         if self.spref.IsSame(query_vector.spref) == 1:
 
-            index_list = list()
-
             # determine which features intersect
-            for j in range(0, query_vector.nfeat):
-                qgeom = query_vector.features[j].GetGeometryRef()
+            query_index, self_index = self.intersecting_pairs(query_vector)
 
-                for i in range(0, self.nfeat):
-
-                    feat = self.features[i]
-                    geom = feat.GetGeometryRef()
-
-                    if geom.Intersects(qgeom):
-                        if filter_query:
-                            index_list.append(j)
-                        else:
-                            index_list.append(i)
+            if filter_query:
+                intersect_index = np.unique(query_index).tolist()
+            else:
+                intersect_index = np.unique(self_index).tolist()
 
-            intersect_index = sorted(set(index_list))
+            source_vector = query_vector if filter_query else self
+            wanted = set(intersect_index)
 
-            for feat_index in intersect_index:
-                if filter_query:
-                    feat = query_vector.features[feat_index]
-                else:
-                    feat = self.features[feat_index]
+            # features are read in one pass so lazy vectors are not materialized
+            for feat_index, feat in enumerate(source_vector.iter_features()):
+                if feat_index not in wanted:
+                    continue
 
                 temp_feature = dict()
                 temp_feature['feat'] = feat
@@ -531,7 +1919,7 @@ class Vector(object):
             # relate memory vector source to Vector object
             out_vector.mem_source = temp_datasource
             out_vector.datasource = temp_datasource
-            out_vector.wktlist = list()
+            out_vector.geometries = GeometryStore()
 
             # update features and crs
             out_vector.nfeat = len(query_list)
@@ -570,7 +1958,7 @@ class Vector(object):
                     temp_feature.SetField(name, attr_dict[name])
 
                 out_vector.features.append(temp_feature)
-                out_vector.wktlist.append(temp_geom.ExportToWkt())
+                out_vector.geometries.append(temp_geom)
                 out_vector.attributes.append(attr_dict)
 
                 # create new feature in output layer
@@ -591,13 +1979,17 @@ class Vector(object):
                   dest_spatial_ref_str=None,
                   dest_spatial_ref_str_type=None,
                   destination_spatial_ref=None,
+                  batch_size=100000,
                   _return=False):
         """
         Transfrom a geometry using OSR library (which is based on PROJ4)
+        Point vectors are transformed in bulk: all coordinates are transformed
+        in one call and the new features are written in batched transactions.
         :param dest_spatial_ref_str: Destination spatial reference string
         :param dest_spatial_ref_str_type: Destination spatial reference string type
         :param destination_spatial_ref: OSR spatial reference object for destination feature
         :param epsg: Destination EPSG SRID code
+        :param batch_size: Number of features per transaction for point vectors
         :return: Reprojected vector object
         """
 
@@ -606,19 +1998,14 @@ class Vector(object):
         vector.nfeat = self.nfeat
 
         if destination_spatial_ref is None:
-            destination_spatial_ref = osr.SpatialReference()
-
             if dest_spatial_ref_str is not None:
-                if dest_spatial_ref_str_type == 'wkt':
-                    res = destination_spatial_ref.ImportFromWkt(dest_spatial_ref_str)
-                elif dest_spatial_ref_str_type == 'proj4':
-                    res = destination_spatial_ref.ImportFromProj4(dest_spatial_ref_str)
-                elif dest_spatial_ref_str_type == 'epsg':
-                    res = destination_spatial_ref.ImportFromEPSG(dest_spatial_ref_str)
+                if dest_spatial_ref_str_type in ('wkt', 'proj4', 'epsg'):
+                    destination_spatial_ref = SpatialRefCache.get_spref(dest_spatial_ref_str,
+                                                                        dest_spatial_ref_str_type)
                 else:
                     raise ValueError("No spatial reference string type specified")
             elif epsg is not None:
-                res = destination_spatial_ref.ImportFromEPSG(epsg)
+                destination_spatial_ref = SpatialRefCache.get_spref(epsg, 'epsg')
 
             else:
                 raise ValueError("Destination spatial reference not specified")
@@ -629,9 +2016,9 @@ class Vector(object):
         # get source spatial reference from Spatial reference WKT string in self
         source_spatial_ref = self.spref
 
-        # create a transform tool (or driver)
-        transform_tool = osr.CoordinateTransformation(source_spatial_ref,
-                                                      destination_spatial_ref)
+        # create a transform tool (or driver), cached for repeated reprojections
+        transform_tool = SpatialRefCache.get_transform(source_spatial_ref,
+                                                       destination_spatial_ref)
 
         # Create a memory layer
         memory_driver = ogr.GetDriverByName('Memory')
@@ -639,62 +2026,121 @@ class Vector(object):
 
         # create a layer in memory
         vector.layer = vector.datasource.CreateLayer('temp',
-                                                     srs=source_spatial_ref,
+                                                     srs=destination_spatial_ref,
                                                      geom_type=self.type)
 
         # initialize new feature list
         vector.features = list()
-        vector.fields = list()
+        vector.fields = list(self.fields)
         vector.name = self.name
 
-        # input layer definition
-        in_layer_definition = self.layer.GetLayerDefn()
-
         # add fields
-        for i in range(0, in_layer_definition.GetFieldCount()):
-            field_definition = in_layer_definition.GetFieldDefn(i)
+        for field_definition in vector.fields:
             vector.layer.CreateField(field_definition)
-            vector.fields.append(field_definition)
 
         # layer definition with new fields
         temp_layer_definition = vector.layer.GetLayerDefn()
 
-        vector.wktlist = list()
-        vector.attributes = self.attributes
+        vector.geometries = GeometryStore()
+        vector.attributes = self.attributes if not self.lazy else list()
 
-        # convert each feature
-        for feat in self.features:
+        field_map = None
 
-            # transform geometry
-            temp_geom = feat.GetGeometryRef()
-            temp_geom.Transform(transform_tool)
+        if ogr.GT_Flatten(self.type) == ogr.wkbPoint:
 
-            vector.wktlist.append(temp_geom.ExportToWkt())
+            # points with z values keep them through the transform
+            has_z = bool(ogr.GT_HasZ(self.type))
 
-            # create new feature using geometry
-            temp_feature = ogr.Feature(temp_layer_definition)
-            temp_feature.SetGeometry(temp_geom)
+            # pull all coordinates and transform them in one call
+            if has_z:
+                coords = np.array(list(geom.GetPoint() for geom in self.iter_geometries()),
+                                  dtype=np.float64).reshape(-1, 3)
+            elif self.coords is not None and self.coords.shape[0] == self.nfeat:
+                coords = np.asarray(self.coords, dtype=np.float64)
+            else:
+                coords = np.array(list(geom.GetPoint_2D() for geom in self.iter_geometries()),
+                                  dtype=np.float64).reshape(-1, 2)
 
-            # fill geometry fields
-            for i in range(0, temp_layer_definition.GetFieldCount()):
-                field_definition = temp_layer_definition.GetFieldDefn(i)
-                temp_feature.SetField(field_definition.GetNameRef(), feat.GetField(i))
+            if coords.shape[0] > 0:
+                coords = np.array(transform_tool.TransformPoints(coords.tolist()),
+                                  dtype=np.float64)[:, 0:coords.shape[1]]
 
-            # add the feature to the shapefile
-            vector.layer.CreateFeature(temp_feature)
+            vector.coords = coords[:, 0:2]
 
-            vector.features.append(temp_feature)
-            vector.epsg = epsg
+            vector.layer.StartTransaction()
+
+            for i, feat in enumerate(self.iter_features()):
+                if field_map is None:
+                    field_map = self.field_map(feat.GetDefnRef(), temp_layer_definition)
+
+                if has_z:
+                    temp_geom = ogr.Geometry(ogr.wkbPoint25D)
+                    temp_geom.AddPoint(coords[i, 0], coords[i, 1], coords[i, 2])
+                else:
+                    temp_geom = ogr.Geometry(ogr.wkbPoint)
+                    temp_geom.AddPoint_2D(coords[i, 0], coords[i, 1])
+
+                # copy fields in one call and set the new geometry
+                temp_feature = ogr.Feature(temp_layer_definition)
+                temp_feature.SetFromWithMap(feat, 1, field_map)
+                temp_feature.SetGeometry(temp_geom)
+
+                vector.layer.CreateFeature(temp_feature)
+                vector.geometries.append(temp_geom)
+
+                if self.lazy:
+                    vector.attributes.append(self._feature_items(feat))
+
+                if (i + 1) % batch_size == 0:
+                    vector.layer.CommitTransaction()
+                    vector.layer.StartTransaction()
+
+            vector.layer.CommitTransaction()
+
+        else:
+            # convert each feature
+            for feat in self.iter_features():
+                if field_map is None:
+                    field_map = self.field_map(feat.GetDefnRef(), temp_layer_definition)
+
+                # transform geometry
+                temp_geom = feat.GetGeometryRef().Clone()
+                temp_geom.Transform(transform_tool)
+
+                vector.geometries.append(temp_geom)
+
+                # create new feature using geometry, copying the fields by name
+                temp_feature = ogr.Feature(temp_layer_definition)
+                temp_feature.SetFromWithMap(feat, 1, field_map)
+                temp_feature.SetGeometry(temp_geom)
+
+                # add the feature to the shapefile
+                vector.layer.CreateFeature(temp_feature)
+
+                if self.lazy:
+                    vector.attributes.append(self._feature_items(feat))
+
+        vector.nfeat = len(vector.geometries)
+
+        vector.epsg = epsg
 
         if _return:
             return vector
         else:
             self.layer = vector.layer
             self.features = vector.features
+            self.attributes = vector.attributes
+            self.nfeat = vector.nfeat
+            self.lazy = False
+            self.transform_tool = None
             self.fields = vector.fields
             self.datasource = vector.datasource
-            self.wktlist = vector.wktlist
+            self.geometries = vector.geometries
+            self.spref = vector.spref
             self.spref_str = vector.spref_str
+            self.epsg = vector.epsg
+            self._reset_geometry_caches()
+            self.coords = vector.coords
 
     @staticmethod
     def reproj_geom(geoms,
@@ -709,25 +2155,32 @@ class Vector(object):
         :return: osgeo geometry
         """
 
-        source_spref = osr.SpatialReference()
-        dest_spref = osr.SpatialReference()
-
-        res = source_spref.ImportFromWkt(source_spref_str)
-        res = dest_spref.ImportFromWkt(dest_spref_str)
-        transform_tool = osr.CoordinateTransformation(source_spref,
-                                                      dest_spref)
+        transform_tool = SpatialRefCache.get_transform(source_spref_str,
+                                                       dest_spref_str,
+                                                       'wkt',
+                                                       'wkt')
 
         if type(geoms).__name__ == 'list':
             for geom in geoms:
-                geom.Transfrom(transform_tool)
+                geom.Transform(transform_tool)
         else:
             geoms.Transform(transform_tool)
         return geoms
 
-    def split(self):
+    def split(self,
+              parent_field='parent_id',
+              batch_size=50000):
         """
         Method to split (or flatten) multi-geometry vector to multiple single geometries vector.
-        The vector can have single or multiple multi-geometry features
+        The vector can have single or multiple multi-geometry features.
+        Parts are exploded in one pass: attributes are copied from the parent feature with a field map,
+        a parent index column is added, and features are inserted in batched transactions.
+        Parts of a parent share its attribute values as compact records, and the parent index of each
+        part is kept as a numpy array in the parent_index attribute of the output vector, e.g. to take
+        rows of the parent attribute table with self.get_attribute_table().filter(parent_index).
+        :param parent_field: Name of the field holding the index of the parent feature
+                             (None to skip the parent index field)
+        :param batch_size: Number of features per transaction
         :return: Vector object with all single type geometries
         """
 
@@ -735,41 +2188,10 @@ class Vector(object):
             return self
         else:
 
-            # get layer information
-            layr = self.layer
-
-            # get field (attribute) information
-            feat_defns = layr.GetLayerDefn()
-            nfields = feat_defns.GetFieldCount()
-            field_defs = list(feat_defns.GetFieldDefn(i) for i in range(0, nfields))
-
-            # create list of features with geometries and attributes
-            out_feat_list = list()
+            field_defs = list(self.fields)
+            field_names = tuple(field.GetName() for field in field_defs)
 
-            out_type = None
-
-            # loop thru all the feature and all the multi-geometries in each feature
-            for feat in self.features:
-
-                geom_ref = feat.GetGeometryRef()
-                n_geom = geom_ref.GetGeometryCount()
-
-                feat_attr = dict()
-                for field in field_defs:
-                    feat_attr[field.GetName()] = feat.GetField(field.GetName())
-
-                # create list of features from multi-geometries
-                for j in range(0, n_geom):
-                    temp_feat_dict = dict()
-                    temp_feat_dict['geom'] = geom_ref.GetGeometryRef(j)
-                    temp_feat_dict['attr'] = feat_attr
-
-                    # find output geometry type
-                    if out_type is None:
-                        out_type = temp_feat_dict['geom'].GetGeometryType()
-
-                    # append to output list
-                    out_feat_list.append(temp_feat_dict)
+            out_type = ogr.GT_Flatten(self.type) - 3
 
             # get driver to write to memory
             memory_driver = ogr.GetDriverByName('Memory')
@@ -781,38 +2203,80 @@ class Vector(object):
             # initialize vector
             temp_vector = Vector()
 
-            # update features and crs
-            temp_vector.nfeat = len(out_feat_list)
             temp_vector.type = out_type
             temp_vector.crs = self.spref
             temp_vector.spref = self.spref
+            temp_vector.spref_str = self.spref_str
             temp_vector.layer = temp_layer
-            temp_vector.data_source = temp_datasource
-            temp_vector.wkt_list = list()
+            temp_vector.datasource = temp_datasource
+            temp_vector.geometries = GeometryStore()
 
             # create field in layer
             for field in field_defs:
                 res = temp_layer.CreateField(field)
                 temp_vector.fields.append(field)
 
+            if parent_field is not None:
+                parent_defn = ogr.FieldDefn(parent_field, ogr.OFTInteger64)
+                temp_layer.CreateField(parent_defn)
+                temp_vector.fields.append(parent_defn)
+                out_names = field_names + (parent_field,)
+            else:
+                out_names = field_names
+
             temp_layer_definition = temp_layer.GetLayerDefn()
+            parent_index_field = temp_layer_definition.GetFieldIndex(parent_field) \
+                if parent_field is not None else -1
 
-            # create new features using geometry
-            for out_feat in out_feat_list:
+            field_map = None
+            parent_index = list()
 
-                # add geometry and attributes
-                temp_feature = ogr.Feature(temp_layer_definition)
-                temp_feature.SetGeometry(out_feat['geom'])
+            temp_layer.StartTransaction()
 
-                for field_name, field_val in out_feat['attr'].items():
-                    temp_feature.SetField(field_name,
-                                          field_val)
+            # loop thru all the features and all the parts of each feature
+            for feat_index, feat in enumerate(self.iter_features()):
 
-                # create feature in layer
-                temp_layer.CreateFeature(temp_feature)
+                if field_map is None:
+                    field_map = self.field_map(feat.GetDefnRef(), temp_layer_definition)
+
+                geom_ref = feat.GetGeometryRef()
+
+                if geom_ref is None:
+                    parts = []
+                elif ogr.GT_Flatten(geom_ref.GetGeometryType()) in (4, 5, 6, 7):
+                    parts = (geom_ref.GetGeometryRef(j) for j in range(geom_ref.GetGeometryCount()))
+                else:
+                    parts = [geom_ref]
 
-                temp_vector.features.append(temp_feature)
-                temp_vector.wkt_list.append(out_feat['geom'].ExportToWkt())
+                # parent values in field order, with their original types; parts share
+                # one tuple of names and one tuple of values per parent
+                parent_attr = self._feature_items(feat) if self.lazy else self.attributes[feat_index]
+                parent_values = tuple(parent_attr.get(name) for name in field_names)
+                if parent_field is not None:
+                    parent_values = parent_values + (feat_index,)
+
+                for part in parts:
+                    temp_feature = ogr.Feature(temp_layer_definition)
+                    temp_feature.SetFromWithMap(feat, 1, field_map)
+                    temp_feature.SetGeometry(part)
+
+                    if parent_index_field >= 0:
+                        temp_feature.SetField(parent_index_field, feat_index)
+
+                    temp_layer.CreateFeature(temp_feature)
+
+                    temp_vector.geometries.append(part)
+                    temp_vector.attributes.append(AttributeRecord(out_names, parent_values))
+                    parent_index.append(feat_index)
+
+                    if len(parent_index) % batch_size == 0:
+                        temp_layer.CommitTransaction()
+                        temp_layer.StartTransaction()
+
+            temp_layer.CommitTransaction()
+
+            temp_vector.nfeat = len(parent_index)
+            temp_vector.parent_index = np.array(parent_index, dtype=np.int64)
 
             return temp_vector
 
@@ -874,19 +2338,13 @@ class Vector(object):
             raise TypeError("Unsupported geometry type")
 
         if spref is None:
-            spref = osr.SpatialReference()
-
             if spref_string is not None:
-                if spref_string_type == 'wkt':
-                    res = spref.ImportFromWkt(spref_string)
-                elif spref_string_type == 'proj4':
-                    res = spref.ImportFromProj4(spref_string)
-                elif spref_string_type == 'epsg':
-                    res = spref.ImportFromEPSG(spref_string)
+                if spref_string_type in ('wkt', 'proj4', 'epsg'):
+                    spref = SpatialRefCache.get_spref(spref_string, spref_string_type)
                 else:
                     raise RuntimeError("No spatial reference")
             else:
-                res = spref.ImportFromEPSG(out_epsg)
+                spref = SpatialRefCache.get_spref(out_epsg, 'epsg')
 
         vector.spref = spref
 
@@ -933,12 +2391,14 @@ class Vector(object):
 
         # layer definition with new fields
         temp_layer_definition = temp_layer.GetLayerDefn()
-        vector.wktlist = list()
+        vector.geometries = GeometryStore()
         vector.attributes = attributes
 
         if verbose:
             print('Adding geometries...\n')
 
+        temp_layer.StartTransaction()
+
         for i, geom in enumerate(geoms):
             # create new feature using geometry
             temp_feature = ogr.Feature(temp_layer_definition)
@@ -949,22 +2409,362 @@ class Vector(object):
                                                  str(len(geoms))))
 
             # copy attributes to each feature, the order is the order of features
-            for attribute in attributes:
-                for attrname, attrval in attribute.items():
-                    temp_feature.SetField(attrname, attrval)
+            attribute = attributes[i] if len(attributes) == len(geoms) else attributes[0]
+            for attrname, attrval in attribute.items():
+                temp_feature.SetField(attrname, attrval)
 
             # create feature in layer
             temp_layer.CreateFeature(temp_feature)
 
             vector.features.append(temp_feature)
-            vector.wktlist.append(geom.ExportToWkt())
+            vector.geometries.append(geom)
+
+        temp_layer.CommitTransaction()
+
+        return vector
+
+    @classmethod
+    def from_points(cls,
+                    x,
+                    y,
+                    attributes=None,
+                    attribute_types=None,
+                    crs=4326,
+                    outfile=None,
+                    batch_size=50000,
+                    verbose=False):
+        """
+        Make a point vector object directly from coordinate arrays, without WKT strings.
+        Features are created in an in-memory layer in batched transactions; the vector keeps
+        the geometries and compact attribute records, not the OGR features.
+        :param x: Array-like of x coordinates (e.g. longitude)
+        :param y: Array-like of y coordinates (e.g. latitude)
+        :param attributes: Dictionary of {attribute name: array-like of values} or an AttributeTable,
+                           with one value per point
+        :param attribute_types: Dictionary of attribute names with their types ('int', 'int64', 'float', 'str').
+                                Types not in this dictionary are taken from the value arrays.
+        :param crs: Spatial reference as EPSG code, WKT string, PROJ4 string, or OSR spatial reference
+                    (default: 4326)
+        :param outfile: If provided, the vector is also written to this file
+        :param batch_size: Number of features per transaction
+        :param verbose: If the steps should be displayed
+        :return: Vector object
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        if x.shape[0] != y.shape[0]:
+            raise ValueError('x and y coordinate arrays have different lengths')
+
+        if isinstance(crs, osr.SpatialReference):
+            spref = crs
+        else:
+            spref = SpatialRefCache.get_spref(crs)
+
+        if attributes is None:
+            attributes = {'GeomID': np.arange(x.shape[0])}
+
+        names = list(attributes.names if isinstance(attributes, AttributeTable) else attributes)
+        columns = list(np.asarray(attributes[name]) for name in names)
+
+        if attribute_types is None:
+            attribute_types = dict()
+
+        types = list()
+        for name, column in zip(names, columns):
+            if name in attribute_types:
+                types.append(attribute_types[name])
+            elif column.dtype.kind == 'b' or (column.dtype.kind == 'i' and column.dtype.itemsize <= 4) or \
+                    (column.dtype.kind == 'u' and column.dtype.itemsize <= 2):
+                types.append('int')
+            elif column.dtype.kind in ('i', 'u'):
+                types.append('int64')
+            elif column.dtype.kind == 'f':
+                types.append('float')
+            else:
+                types.append('str')
+
+        vector = cls()
+        vector.spref = spref
+        vector.spref_str = spref.ExportToWkt()
+        vector.type = OGR_TYPE_DEF['point']
+        vector.attr_def = dict(zip(names, types))
+
+        memory_driver = ogr.GetDriverByName('Memory')
+        vector.datasource = memory_driver.CreateDataSource('out')
+        vector.layer = vector.datasource.CreateLayer('temp_layer',
+                                                     srs=spref,
+                                                     geom_type=vector.type)
+
+        for name, attr_type in zip(names, types):
+            fielddefn = ogr.FieldDefn(name, OGR_FIELD_DEF[attr_type])
+            if attr_type == 'str':
+                fielddefn.SetWidth(vector.width)
+            vector.layer.CreateField(fielddefn)
+            vector.fields.append(fielddefn)
+
+        layer_definition = vector.layer.GetLayerDefn()
+        field_index = list(layer_definition.GetFieldIndex(name) for name in names)
+
+        # convert columns to python values once, instead of per cell
+        values = list(column.astype(np.str_).tolist() if attr_type == 'str' else column.tolist()
+                      for column, attr_type in zip(columns, types))
+        xs, ys = x.tolist(), y.tolist()
+
+        if verbose:
+            Opt.cprint('Adding {} points...'.format(str(len(xs))))
+
+        for start in range(0, len(xs), batch_size):
+            vector.layer.StartTransaction()
+
+            for i in range(start, min(start + batch_size, len(xs))):
+                geom = ogr.Geometry(ogr.wkbPoint)
+                geom.AddPoint_2D(xs[i], ys[i])
+
+                feat = ogr.Feature(layer_definition)
+                feat.SetGeometry(geom)
+
+                for j, column_values in zip(field_index, values):
+                    feat.SetField(j, column_values[i])
+
+                vector.layer.CreateFeature(feat)
+                vector.geometries.append(geom)
+
+            vector.layer.CommitTransaction()
+
+        # compact attribute records sharing one tuple of names
+        attr_names = tuple(names)
+        vector.attributes = list(AttributeRecord(attr_names, row) for row in zip(*values)) if len(names) > 0 \
+            else list(AttributeRecord(attr_names, ()) for _ in xs)
+        vector.coords = np.column_stack([x, y])
+        vector.nfeat = len(xs)
+
+        if outfile is not None:
+            vector.write_vector(outfile)
 
         return vector
 
+    @staticmethod
+    def _ring_segments(geom):
+        """
+        Method to get all ring segments of a (multi)polygon geometry as coordinate arrays
+        :param geom: OGR geometry
+        :return: Tuple of numpy arrays (x0, y0, x1, y1)
+        """
+        rings = list()
+
+        def collect(temp_geom):
+            if temp_geom.GetGeometryCount() == 0:
+                points = temp_geom.GetPoints()
+                if points is not None and len(points) > 1:
+                    rings.append(np.array(points, dtype=np.float64)[:, 0:2])
+            else:
+                for i in range(temp_geom.GetGeometryCount()):
+                    collect(temp_geom.GetGeometryRef(i))
+
+        collect(geom)
+
+        if len(rings) == 0:
+            empty = np.zeros(0, dtype=np.float64)
+            return empty, empty, empty, empty
+
+        # close open rings
+        rings = list(ring if (ring[0] == ring[-1]).all() else np.vstack([ring, ring[0:1]])
+                     for ring in rings)
+
+        start_pts = np.concatenate(list(ring[:-1] for ring in rings))
+        end_pts = np.concatenate(list(ring[1:] for ring in rings))
+
+        return start_pts[:, 0], start_pts[:, 1], end_pts[:, 0], end_pts[:, 1]
+
+    @staticmethod
+    def _edge_cells(x0,
+                    y0,
+                    x1,
+                    y1,
+                    grid,
+                    ncols,
+                    nrows):
+        """
+        Method to mark the grid cells crossed or touched by line segments (supercover traversal).
+        Each segment is cut where it crosses grid lines; the cells around the cut points and
+        the cells containing the midpoints between consecutive cuts are marked, so only
+        about (columns + rows crossed) cells are visited per segment, for all segments at once.
+        :param x0: Numpy array of segment start x coordinates
+        :param y0: Numpy array of segment start y coordinates
+        :param x1: Numpy array of segment end x coordinates
+        :param y1: Numpy array of segment end y coordinates
+        :param grid: Tuple of (grid min x, grid max y, cell width, cell height); rows go down from max y
+        :param ncols: Number of grid columns
+        :param nrows: Number of grid rows
+        :return: Boolean numpy array of length ncols * nrows, indexed by col * nrows + row
+        """
+        minx, maxy, cell_width, cell_height = grid
+        nseg = x0.shape[0]
+
+        # segments in grid units
+        u0, u1 = (x0 - minx) / cell_width, (x1 - minx) / cell_width
+        v0, v1 = (maxy - y0) / cell_height, (maxy - y1) / cell_height
+
+        def line_cuts(a0, a1):
+            lo = np.floor(np.minimum(a0, a1))
+            ncuts = (np.floor(np.maximum(a0, a1)) - lo).astype(np.int64)
+            seg = np.repeat(np.arange(nseg), ncuts)
+            lines = np.repeat(lo, ncuts) + 1 + \
+                (np.arange(seg.shape[0]) - np.repeat(np.cumsum(ncuts) - ncuts, ncuts))
+            return seg, (lines - a0[seg]) / (a1[seg] - a0[seg])
+
+        useg, ut = line_cuts(u0, u1)
+        vseg, vt = line_cuts(v0, v1)
+
+        seg = np.concatenate([np.arange(nseg), np.arange(nseg), useg, vseg])
+        t = np.concatenate([np.zeros(nseg), np.ones(nseg), ut, vt])
+
+        order = np.lexsort((t, seg))
+        seg, t = seg[order], t[order]
+
+        boundary = np.zeros(ncols * nrows, dtype=bool)
+
+        def mark(seg_idx, t_idx, eps):
+            u = u0[seg_idx] + t_idx * (u1[seg_idx] - u0[seg_idx])
+            v = v0[seg_idx] + t_idx * (v1[seg_idx] - v0[seg_idx])
+            for du in set((-eps, eps)):
+                for dv in set((-eps, eps)):
+                    col = np.clip(np.floor(u + du).astype(np.int64), 0, ncols - 1)
+                    row = np.clip(np.floor(v + dv).astype(np.int64), 0, nrows - 1)
+                    boundary[col * nrows + row] = True
+
+        # cells around the cut points (touching cells where a cut falls on a grid line or corner)
+        mark(seg, t, 1e-9)
+
+        # cells crossed between consecutive cuts
+        same = seg[1:] == seg[:-1]
+        mark(seg[1:][same], (t[1:][same] + t[:-1][same]) / 2.0, 0.0)
+
+        return boundary
+
+    @staticmethod
+    def grid_cells(geom,
+                   div=10,
+                   chunk_size=64):
+        """
+        Method to make a square grid over the bounds of a polygon and classify the grid cells.
+        Cells crossed or touched by a polygon edge are boundary candidates and are
+        tested against the (prepared, if shapely is available) polygon; all other cells are
+        entirely inside or outside and are classified by a vectorized even-odd test of their centers.
+        Cell IDs are numbered by column and then by row, from the top left cell.
+        :param geom: OGR polygon or multipolygon geometry, WKT string,
+                     or list of coordinates: [[x1,y1],[x2,y2],...]
+        :param div: Number of divisions along x or y (default: 10)
+        :param chunk_size: Number of grid rows classified at a time
+        :return: Tuple of numpy arrays:
+                 (cell IDs, cell bounds of shape (ncells, 4) as (xmin, xmax, ymin, ymax),
+                  boolean mask of cells intersecting the polygon,
+                  boolean mask of cells inside the polygon)
+        """
+        if type(geom) in (list, tuple):
+            coords_list = list(list(coord) for coord in geom)
+            if coords_list[-1][0] != coords_list[0][0] or coords_list[-1][1] != coords_list[0][1]:
+                coords_list.append(coords_list[0])
+            geom = Vector.get_osgeo_geom(Vector.wkt_from_coords(coords_list,
+                                                                geom_type='polygon'))
+        elif type(geom) == str:
+            geom = Vector.get_osgeo_geom(geom)
+
+        minx, maxx, miny, maxy = geom.GetEnvelope()
+
+        xedges = np.linspace(minx, maxx, div + 1)
+        yedges = np.linspace(maxy, miny, div + 1)
+
+        ncols = nrows = div
+        cell_width = (maxx - minx) / float(div)
+        cell_height = (maxy - miny) / float(div)
+
+        # cell (col, row) has id col * nrows + row
+        cols, rows = np.meshgrid(np.arange(ncols), np.arange(nrows), indexing='ij')
+        cols = cols.ravel()
+        rows = rows.ravel()
+
+        cell_ids = cols * nrows + rows
+        cell_bounds = np.column_stack([xedges[cols], xedges[cols + 1],
+                                       yedges[rows + 1], yedges[rows]])
+
+        intersects = np.zeros(cell_ids.shape[0], dtype=bool)
+        inside = np.zeros(cell_ids.shape[0], dtype=bool)
+
+        x0, y0, x1, y1 = Vector._ring_segments(geom)
+
+        if x0.shape[0] == 0:
+            return cell_ids, cell_bounds, intersects, inside
+
+        # mark boundary candidates: cells crossed or touched by an edge
+        boundary = Vector._edge_cells(x0, y0, x1, y1,
+                                      (minx, maxy, cell_width, cell_height),
+                                      ncols,
+                                      nrows)
+
+        # even-odd test of cell centers, one chunk of grid rows at a time
+        xcenter = (xedges[:-1] + xedges[1:]) / 2.0
+        ycenter = (yedges[:-1] + yedges[1:]) / 2.0
+
+        center_inside = np.zeros((ncols, nrows), dtype=bool)
+
+        for start in range(0, nrows, chunk_size):
+            yc = ycenter[start:start + chunk_size]
+
+            # edges crossing each row center line (half-open rule for vertices on the line)
+            crosses = ((y0[np.newaxis, :] > yc[:, np.newaxis]) != (y1[np.newaxis, :] > yc[:, np.newaxis]))
+            row_idx, seg_idx = np.nonzero(crosses)
+
+            x_cross = x0[seg_idx] + (yc[row_idx] - y0[seg_idx]) * \
+                (x1[seg_idx] - x0[seg_idx]) / (y1[seg_idx] - y0[seg_idx])
+
+            for ii in range(yc.shape[0]):
+                row_cross = np.sort(x_cross[row_idx == ii])
+                center_inside[:, start + ii] = (np.searchsorted(row_cross, xcenter) % 2) == 1
+
+        center_inside = center_inside.ravel()
+
+        inside = center_inside & ~boundary
+        intersects = inside.copy()
+
+        # exact tests only on boundary candidate cells
+        boundary_index = np.nonzero(boundary)[0]
+
+        try:
+            from shapely import wkb as shapely_wkb
+            from shapely.prepared import prep
+            from shapely.geometry import box
+
+            prepared_geom = prep(shapely_wkb.loads(bytes(geom.ExportToWkb())))
+
+            for i in boundary_index.tolist():
+                cell_geom = box(cell_bounds[i, 0], cell_bounds[i, 2], cell_bounds[i, 1], cell_bounds[i, 3])
+                intersects[i] = prepared_geom.intersects(cell_geom)
+                inside[i] = intersects[i] and prepared_geom.contains(cell_geom)
+
+        except ImportError:
+            for i in boundary_index.tolist():
+                xmin, xmax, ymin, ymax = cell_bounds[i].tolist()
+
+                ring = ogr.Geometry(ogr.wkbLinearRing)
+                for x, y in ((xmin, ymax), (xmax, ymax), (xmax, ymin), (xmin, ymin), (xmin, ymax)):
+                    ring.AddPoint_2D(x, y)
+
+                cell_geom = ogr.Geometry(ogr.wkbPolygon)
+                cell_geom.AddGeometry(ring)
+
+                intersects[i] = geom.Intersects(cell_geom)
+                inside[i] = intersects[i] and geom.Contains(cell_geom)
+
+        return cell_ids, cell_bounds, intersects, inside
+
     @staticmethod
     def polygon_bound_grid(coords_list,
                            div=10,
-                           intersect_check=False):
+                           intersect_check=False,
+                           return_ids=False):
 
         """
         Method to get square grid intersecting a polygon
@@ -972,68 +2772,299 @@ class Vector(object):
         :param coords_list: list of coordinates: [[x1,y1],[x2,y2],...]
         :param div: Number of divisions along x or y (default: 10)
         :param intersect_check: If only the intersecting coordinates should be returned
+        :param return_ids: If the cell IDs, cell bounds array and intersect/inside masks
+                           from Vector.grid_cells() should be returned instead of coordinate lists
         :return: List of list of coordinates (square)
         """
 
-        temp_coords_list = Opt.__copy__(coords_list)
+        cell_ids, cell_bounds, intersects, inside = Vector.grid_cells(coords_list,
+                                                                      div=div)
 
-        if temp_coords_list[-1][0] != temp_coords_list[0][0] or temp_coords_list[-1][1] != temp_coords_list[0][1]:
-            temp_coords_list.append(temp_coords_list[0])
+        if return_ids:
+            return cell_ids, cell_bounds, intersects, inside
+
+        if intersect_check:
+            cell_bounds = cell_bounds[intersects]
 
-        bounds_wkt = Vector.wkt_from_coords(temp_coords_list,
-                                            geom_type='polygon')
-        bounds_geom = Vector.get_osgeo_geom(bounds_wkt)
+        return list([[xmin, ymax],
+                     [xmax, ymax],
+                     [xmax, ymin],
+                     [xmin, ymin],
+                     [xmin, ymax]] for xmin, xmax, ymin, ymax in cell_bounds.tolist())
 
-        bounds_maxx = max(list(coord[0] for coord in temp_coords_list))
-        bounds_minx = min(list(coord[0] for coord in temp_coords_list))
-        bounds_maxy = max(list(coord[1] for coord in temp_coords_list))
-        bounds_miny = min(list(coord[1] for coord in temp_coords_list))
+    @staticmethod
+    def hilbert_index(x,
+                      y,
+                      bounds=None,
+                      order=16):
+        """
+        Method to get the Hilbert curve index of points, computed for all points at once
+        :param x: Numpy array of x coordinates
+        :param y: Numpy array of y coordinates
+        :param bounds: Bounds (xmin, xmax, ymin, ymax) of the curve (default: bounds of the points)
+        :param order: Curve order; the bounds are divided in 2^order x 2^order cells
+        :return: Numpy array of int64 Hilbert indices
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
 
-        xcoords = Sublist.frange(bounds_minx, bounds_maxx, div=div)
-        ycoords = Sublist.frange(bounds_miny, bounds_maxy, div=div).reverse()
+        if bounds is None:
+            bounds = (x.min(), x.max(), y.min(), y.max())
 
-        geom_list = list()
+        side = 2 ** order
+        xspan = max(bounds[1] - bounds[0], 1e-12)
+        yspan = max(bounds[3] - bounds[2], 1e-12)
 
-        for i in range(len(xcoords) - 1):
-            for j in range(len(ycoords) - 1):
-                geom_list.append([[xcoords[i], ycoords[j]],
-                                  [xcoords[i + 1], ycoords[j]],
-                                  [xcoords[i + 1], ycoords[j + 1]],
-                                  [xcoords[i], ycoords[j + 1]],
-                                  [xcoords[i], ycoords[j]]])
+        xi = np.clip(((x - bounds[0]) / xspan * (side - 1)).astype(np.int64), 0, side - 1)
+        yi = np.clip(((y - bounds[2]) / yspan * (side - 1)).astype(np.int64), 0, side - 1)
 
-        if intersect_check:
-            wkt_list = list(Vector.wkt_from_coords(geom_coords, geom_type='polygon')
-                            for geom_coords in geom_list)
+        hindex = np.zeros(x.shape[0], dtype=np.int64)
+
+        s = side // 2
+        while s > 0:
+            rx = (xi & s) > 0
+            ry = (yi & s) > 0
+
+            hindex += s * s * ((3 * rx) ^ ry)
+
+            # rotate the quadrant
+            flip = (~ry) & rx
+            xi = np.where(flip, side - 1 - xi, xi)
+            yi = np.where(flip, side - 1 - yi, yi)
+
+            swap = ~ry
+            xi, yi = np.where(swap, yi, xi), np.where(swap, xi, yi)
+
+            s //= 2
+
+        return hindex
+
+    @staticmethod
+    def vertex_count(geom):
+        """
+        Method to count the vertices of a geometry, including all parts and rings
+        :param geom: OGR geometry
+        :return: Number of vertices
+        """
+        if geom is None:
+            return 0
+        if geom.GetGeometryCount() == 0:
+            return geom.GetPointCount()
+        return sum(Vector.vertex_count(geom.GetGeometryRef(i)) for i in range(geom.GetGeometryCount()))
+
+    def partition(self,
+                  nparts=None,
+                  grid=None,
+                  by_attribute=None,
+                  weight='count',
+                  outdir=None,
+                  out_format='shp',
+                  batch_size=50000,
+                  max_open=64):
+        """
+        Method to split the features of the vector in partitions, e.g. one per SLURM array task.
+        Partitions are made in one of three ways:
+        nparts: features are ordered along a Hilbert curve over their bounding box centers and the curve
+                is cut into nparts runs of (about) equal weight, so partitions are balanced and compact
+        grid: (ncols, nrows) grid over the vector extent, one partition per non-empty cell
+        by_attribute: one partition per value of an attribute
+        Partition files are named <name>_part<i>.<out_format> with i starting from 1 to match SLURM
+        array task IDs (see Handler.write_slurm_script).
+        :param nparts: Number of partitions
+        :param grid: Tuple of (number of columns, number of rows)
+        :param by_attribute: Attribute name
+        :param weight: Balance partitions by feature 'count' or by number of 'vertices' (nparts only)
+        :param outdir: Folder to write partition files to (default: None, partitions in memory)
+        :param out_format: File extension of the partition files (default: 'shp')
+        :param batch_size: Number of features per transaction
+        :param max_open: Maximum number of partition files open at a time; features are read
+                         once per group of max_open partitions (default: 64)
+        :return: List of file names if outdir is provided, else list of Vector objects;
+                 and numpy array of partition index (starting from 0) per feature.
+                 With nparts, exactly nparts outputs are returned, some of which may be empty
+                 (e.g. more partitions than features), so output i always matches array task i + 1
+        """
+        if self.nfeat == 0:
+            part_index = np.zeros(0, dtype=np.int64)
+
+        elif by_attribute is not None:
+            values = self.get_attribute_table(columns=[by_attribute])[by_attribute]
+            uniq_values, part_index = np.unique(values, return_inverse=True)
+
+        else:
+            bounds = self.get_bounds_array()
+            xcenter = (bounds[:, 0] + bounds[:, 1]) / 2.0
+            ycenter = (bounds[:, 2] + bounds[:, 3]) / 2.0
+            valid = np.isfinite(xcenter) & np.isfinite(ycenter)
+            xcenter[~valid] = np.nanmin(xcenter[valid]) if valid.any() else 0.0
+            ycenter[~valid] = np.nanmin(ycenter[valid]) if valid.any() else 0.0
+
+            if grid is not None:
+                ncols, nrows = grid
+                xmin, xmax, ymin, ymax = xcenter.min(), xcenter.max(), ycenter.min(), ycenter.max()
 
-            index = list()
+                col = np.clip(((xcenter - xmin) / max(xmax - xmin, 1e-12) * ncols).astype(np.int64), 0, ncols - 1)
+                row = np.clip(((ymax - ycenter) / max(ymax - ymin, 1e-12) * nrows).astype(np.int64), 0, nrows - 1)
 
-            for i, geom_wkt in enumerate(wkt_list):
-                temp_geom = Vector.get_osgeo_geom(geom_wkt)
-                if temp_geom.Intersects(bounds_geom):
-                    index.append(i)
+                _, part_index = np.unique(row * ncols + col, return_inverse=True)
 
-            return list(geom_list[i] for i in index)
+            elif nparts is not None:
+                order = np.argsort(self.hilbert_index(xcenter, ycenter), kind='mergesort')
 
+                if weight == 'vertices':
+                    weights = np.array(list(self.vertex_count(geom) for geom in self.iter_geometries()),
+                                       dtype=np.float64)
+                else:
+                    weights = np.ones(xcenter.shape[0], dtype=np.float64)
+
+                # cut the curve where the cumulative weight crosses multiples of total/nparts
+                cum_weight = np.cumsum(weights[order])
+                total = cum_weight[-1] if cum_weight.shape[0] > 0 else 0.0
+
+                part_index = np.zeros(xcenter.shape[0], dtype=np.int64)
+                if total > 0:
+                    part_index[order] = np.minimum(((cum_weight - weights[order] / 2.0) /
+                                                    total * nparts).astype(np.int64), nparts - 1)
+            else:
+                raise ValueError('One of nparts, grid or by_attribute is required')
+
+        part_index = np.asarray(part_index, dtype=np.int64).ravel()
+        part_list = part_index.tolist()
+
+        if nparts is not None and grid is None and by_attribute is None:
+            nout = int(nparts)
         else:
-            return geom_list
+            nout = int(part_index.max()) + 1 if part_index.shape[0] > 0 else 0
+
+        outputs = list()
+
+        # partition files are written in groups of at most max_open open files, one pass
+        # over the features per group; in-memory partitions are written in one pass
+        group_size = max(1, int(max_open)) if outdir is not None else max(1, nout)
+
+        for group_start in range(0, nout, group_size):
+            group_end = min(group_start + group_size, nout)
+            layers = list()
+
+            for ii in range(group_start, group_end):
+                if outdir is not None:
+                    outfile = os.path.join(outdir, '{}_part{}.{}'.format(self.name,
+                                                                        str(ii + 1),
+                                                                        out_format))
+                    driver_type = self.get_driver_name(outfile)
+                    out_driver = ogr.GetDriverByName(driver_type)
+
+                    if os.path.isfile(outfile):
+                        out_driver.DeleteDataSource(outfile)
+
+                    out_datasource = out_driver.CreateDataSource(outfile)
+                    outputs.append(outfile)
+                else:
+                    out_driver = ogr.GetDriverByName('Memory')
+                    out_datasource = out_driver.CreateDataSource('part{}'.format(str(ii + 1)))
+
+                out_layer = out_datasource.CreateLayer('{}_part{}'.format(self.name, str(ii + 1)),
+                                                       srs=self.spref,
+                                                       geom_type=self.type)
+                for field in self.fields:
+                    out_layer.CreateField(field)
+
+                if outdir is None:
+                    part_vector = Vector()
+                    part_vector.name = '{}_part{}'.format(self.name, str(ii + 1))
+                    part_vector.datasource = out_datasource
+                    part_vector.layer = out_layer
+                    part_vector.type = self.type
+                    part_vector.spref = self.spref
+                    part_vector.spref_str = self.spref_str
+                    part_vector.fields = list(self.fields)
+                    outputs.append(part_vector)
+
+                out_layer.StartTransaction()
+                layers.append((out_datasource, out_layer))
+
+            counts = [0] * (group_end - group_start)
+            field_map = None
+
+            for i, feat in enumerate(self.iter_features()):
+                ii = part_list[i]
+                if not group_start <= ii < group_end:
+                    continue
+
+                out_layer = layers[ii - group_start][1]
+
+                # source features may hold more fields, or fields in another order, than the output
+                if field_map is None:
+                    field_map = self.field_map(feat.GetDefnRef(), out_layer.GetLayerDefn())
+
+                out_feat = ogr.Feature(out_layer.GetLayerDefn())
+                out_feat.SetFromWithMap(feat, 1, field_map)
+                out_layer.CreateFeature(out_feat)
+
+                if outdir is None:
+                    part_vector = outputs[ii]
+                    part_vector.geometries.append(out_feat.GetGeometryRef())
+                    part_vector.attributes.append(self._feature_items(feat) if self.lazy
+                                                  else self.attributes[i].copy())
+
+                counts[ii - group_start] += 1
+                if counts[ii - group_start] % batch_size == 0:
+                    out_layer.CommitTransaction()
+                    out_layer.StartTransaction()
+
+            for out_datasource, out_layer in layers:
+                out_layer.CommitTransaction()
+
+            if outdir is None:
+                for ii, count in zip(range(group_start, group_end), counts):
+                    outputs[ii].nfeat = count
+
+            # close the partition files of the group
+            layers = out_datasource = out_layer = None
+
+        return outputs, part_index
 
     def rasterize(self,
                   outfile=None,
                   pixel_size=None,
-                  out_type=gdal.GDT_Byte,
+                  out_type=None,
                   nodatavalue=0,
-                  extent=None):
+                  extent=None,
+                  burn_value=1,
+                  burn_attribute=None,
+                  burn_ids=False,
+                  all_touched=True,
+                  tile_size=1024,
+                  nthreads=None,
+                  compress='LZW',
+                  verbose=False):
 
         """
-        Method to rasterize a vector layer
+        Method to rasterize a vector layer in tiles. The output grid is split into tiles,
+        only the features intersecting a tile (found using the spatial index) are burned into it,
+        and tiles are burned in parallel and written to a tiled, compressed GeoTIFF one window
+        at a time. Tiles without features are not written and read as no data.
         :param outfile: Output file name
         :param pixel_size: Pixel size (x, y) in spatial ref units
         :param out_type: Output data type: gdal.GDT_Byte or 1, etc.
+                         (default: gdal.GDT_UInt32 if burn_ids is True, else gdal.GDT_Byte)
         :param nodatavalue: No data Value
         :param extent: Extent in spatial ref units (x_min, x_max, y_min, y_max)
+        :param burn_value: Value to burn for all features (default: 1)
+        :param burn_attribute: Numeric attribute to burn instead of burn_value; features with
+                               null values are not burned
+        :param burn_ids: If feature IDs (feature index + 1) should be burned instead of burn_value
+        :param all_touched: If all pixels touched by a feature should be burned,
+                            otherwise only pixels whose center is inside the feature
+        :param tile_size: Tile size in pixels, rounded up to a multiple of the 256 pixel block size
+        :param nthreads: Number of threads burning tiles (default: number of CPUs)
+        :param compress: Compression for the output file (default: 'LZW')
+        :param verbose: If the steps should be displayed
         :return: None
         """
+        from multiprocessing.pool import ThreadPool
+        from multiprocessing import cpu_count
+        from collections import deque
 
         if pixel_size is None:
             pixel_size = (30, 30)
@@ -1041,19 +3072,51 @@ class Vector(object):
         if outfile is None:
             outfile = self.filename.split('.')[0] + '_.tif'
 
+        if out_type is None:
+            out_type = gdal.GDT_UInt32 if burn_ids else gdal.GDT_Byte
+
         if extent is None:
             x_min, x_max, y_min, y_max = self.layer.GetExtent()
         else:
             x_min, x_max, y_min, y_max = extent
 
-        cols = int(math.ceil((x_max - x_min) / pixel_size[1]))
-        rows = int(math.ceil((y_max - y_min) / pixel_size[0]))
+        cols = int(math.ceil((x_max - x_min) / pixel_size[0]))
+        rows = int(math.ceil((y_max - y_min) / pixel_size[1]))
+
+        # geometries and their bounding box index; lazy vectors are read once here
+        if self.lazy:
+            geoms = GeometryStore(self.iter_geometries())
+            spatial_index = SpatialIndex(list(geom.GetEnvelope() if geom is not None
+                                              else (np.inf, -np.inf, np.inf, -np.inf) for geom in geoms))
+        else:
+            geoms = self.geometries
+            spatial_index = self.get_spatial_index()
+
+        if burn_attribute is not None:
+            burn_values = self.get_attribute_table(columns=[burn_attribute])[burn_attribute].astype(np.float64)
+        elif burn_ids:
+            burn_values = np.arange(1, len(geoms) + 1, dtype=np.float64)
+        else:
+            burn_values = np.full(len(geoms), burn_value, dtype=np.float64)
+
+        block_size = 256
+        tile_size = int(math.ceil(tile_size / float(block_size))) * block_size
+
+        tiles = list((xoff, yoff, min(tile_size, cols - xoff), min(tile_size, rows - yoff))
+                     for yoff in range(0, rows, tile_size)
+                     for xoff in range(0, cols, tile_size))
 
         target_ds = gdal.GetDriverByName('GTiff').Create(outfile,
                                                          cols,
                                                          rows,
                                                          1,
-                                                         out_type)
+                                                         out_type,
+                                                         ['TILED=YES',
+                                                          'BLOCKXSIZE={}'.format(str(block_size)),
+                                                          'BLOCKYSIZE={}'.format(str(block_size)),
+                                                          'COMPRESS={}'.format(compress),
+                                                          'SPARSE_OK=TRUE',
+                                                          'BIGTIFF=IF_SAFER'])
 
         target_ds.SetGeoTransform((x_min,
                                   pixel_size[0],
@@ -1068,14 +3131,81 @@ class Vector(object):
         band = target_ds.GetRasterBand(1)
         band.SetNoDataValue(nodatavalue)
 
-        gdal.RasterizeLayer(target_ds,
-                            [1],
-                            self.layer,
-                            None,
-                            None,
-                            [1],
-                            ['ALL_TOUCHED=TRUE'])
+        rasterize_options = ['ATTRIBUTE=burn']
+        if all_touched:
+            rasterize_options.append('ALL_TOUCHED=TRUE')
+
+        def burn_tile(tile):
+            xoff, yoff, xsize, ysize = tile
+
+            tile_x_min = x_min + xoff * pixel_size[0]
+            tile_y_max = y_max - yoff * pixel_size[1]
+
+            feat_index = spatial_index.query((tile_x_min,
+                                              tile_x_min + xsize * pixel_size[0],
+                                              tile_y_max - ysize * pixel_size[1],
+                                              tile_y_max))
+            feat_index = feat_index[np.isfinite(burn_values[feat_index])]
+
+            if feat_index.shape[0] == 0:
+                return
+
+            tile_ds = gdal.GetDriverByName('MEM').Create('', xsize, ysize, 1, out_type)
+            tile_ds.SetGeoTransform((tile_x_min, pixel_size[0], 0, tile_y_max, 0, -1.0*pixel_size[1]))
+            tile_ds.SetProjection(target_ds_srs.ExportToWkt())
+            tile_ds.GetRasterBand(1).Fill(nodatavalue)
+
+            tile_vector = ogr.GetDriverByName('Memory').CreateDataSource('tile')
+            tile_layer = tile_vector.CreateLayer('tile', srs=target_ds_srs, geom_type=ogr.wkbUnknown)
+            tile_layer.CreateField(ogr.FieldDefn('burn', ogr.OFTReal))
+            tile_layer_definition = tile_layer.GetLayerDefn()
+
+            for i in feat_index.tolist():
+                feat = ogr.Feature(tile_layer_definition)
+                feat.SetGeometryDirectly(geoms[i])
+                feat.SetField(0, float(burn_values[i]))
+                tile_layer.CreateFeature(feat)
+
+            gdal.RasterizeLayer(tile_ds,
+                                [1],
+                                tile_layer,
+                                options=rasterize_options)
+
+            return tile_ds.ReadAsArray()
+
+        if nthreads is None:
+            nthreads = cpu_count()
+
+        nthreads = max(1, int(nthreads))
+        pool = ThreadPool(nthreads)
+        pending = deque()
 
+        # tiles are burned on worker threads and written on this thread as they complete,
+        # keeping at most two tiles per thread in memory
+        try:
+            ii = 0
+            while len(tiles) > 0 or len(pending) > 0:
+                while len(tiles) > 0 and len(pending) < 2 * nthreads:
+                    tile = tiles.pop(0)
+                    pending.append((tile, pool.apply_async(burn_tile, (tile,))))
+
+                tile, result = pending.popleft()
+                tile_arr = result.get()
+
+                if tile_arr is not None:
+                    band.WriteArray(tile_arr, tile[0], tile[1])
+
+                ii += 1
+                if verbose:
+                    Opt.cprint('Rasterized tile {} at ({}, {})'.format(str(ii),
+                                                                     str(tile[0]),
+                                                                     str(tile[1])))
+        finally:
+            pool.terminate()
+            pool.join()
+
+        band.FlushCache()
+        band = None
         target_ds = None
 
     @staticmethod
@@ -1090,38 +3220,30 @@ class Vector(object):
         :return: list of bound rectangles - subset from original
         """
 
-        minx = min(list(coord[0] for coord in coords))
-        miny = min(list(coord[1] for coord in coords))
-        maxx = max(list(coord[0] for coord in coords))
-        maxy = max(list(coord[1] for coord in coords))
+        coords = np.asarray(coords, dtype=np.float64)
+
+        minx, miny = coords[:, 0:2].min(axis=0).tolist()
+        maxx, maxy = coords[:, 0:2].max(axis=0).tolist()
 
         out_coords_list = list()
 
         if part == 'horiz':
-            ypart_list = Sublist.frange(miny, maxy, div=nparts)
-            ypart_tup = ypart_list.tuple_by_pairs()
+            yedges = np.linspace(miny, maxy, nparts + 1).tolist()
 
-            for tup in ypart_tup:
-                coords_ = [[minx, tup[0]],
-                           [minx, tup[1]],
-                           [maxx, tup[1]],
-                           [maxx, tup[0]],
-                           [minx, tup[0]]]
-
-                out_coords_list.append(coords_)
+            out_coords_list = list([[minx, y_lo],
+                                    [minx, y_hi],
+                                    [maxx, y_hi],
+                                    [maxx, y_lo],
+                                    [minx, y_lo]] for y_lo, y_hi in zip(yedges[:-1], yedges[1:]))
 
         if part == 'vert':
-            xpart_list = Sublist.frange(minx, maxx, div=nparts)
-            xpart_tup = xpart_list.tuple_by_pairs()
-
-            for tup in xpart_tup:
-                coords_ = [[tup[0], miny],
-                           [tup[0], maxy],
-                           [tup[1], maxy],
-                           [tup[1], miny],
-                           [tup[0], miny]]
+            xedges = np.linspace(minx, maxx, nparts + 1).tolist()
 
-                out_coords_list.append(coords_)
+            out_coords_list = list([[x_lo, miny],
+                                    [x_lo, maxy],
+                                    [x_hi, maxy],
+                                    [x_hi, miny],
+                                    [x_lo, miny]] for x_lo, x_hi in zip(xedges[:-1], xedges[1:]))
 
         return out_coords_list
 
@@ -1,4 +1,4 @@
-from modules import Vector, Handler
+from modules import Vector, AttributeTable
 
 
 if __name__ == '__main__':
@@ -6,38 +6,23 @@ if __name__ == '__main__':
     csvfile = "D:/Shared/Dropbox/projects/NAU/landsat_diva/data2/gee_mack_data_extract_30_v2019_07_09T20_11_02_3_2000.csv"
     outfile = "D:/Shared/Dropbox/projects/NAU/landsat_diva/data2/gee_mack_data_extract_30_v2019_07_09T20_11_02_3_2000.shp"
 
-    samp_data = Handler(csvfile).read_from_csv(return_dicts=True)
-
-    headers = list(samp_data[0])
+    samp_table = AttributeTable.from_csv(csvfile)
 
     spref_str = '+proj=longlat +datum=WGS84'
 
-    wkt_list = list()
-    attr_list = list()
     attribute_types = dict()
 
-    for header in headers:
-        attribute_types[header] = Handler.string_to_type(samp_data[0][header],
-                                                         return_type=True)
-
     # attribute_types['DecidFracR'] = 'str'
     # attribute_types['TreeCovR'] = 'str'
 
-    for k, v in attribute_types.items():
-        print('{} - {}'.format(str(k), str(v)))
-
-    for elem in samp_data:
-        wkt_list.append(Vector.wkt_from_coords((elem['longitude'], elem['latitude']),
-                                               geom_type='point'))
-
-        attr_list.append(elem)
+    vector = Vector.from_points(samp_table['longitude'],
+                                samp_table['latitude'],
+                                attributes=samp_table,
+                                attribute_types=attribute_types,
+                                crs=spref_str)
 
-    vector = Vector.vector_from_string(wkt_list,
-                                       spref_string=spref_str,
-                                       spref_string_type='proj4',
-                                       vector_type='point',
-                                       attributes=attr_list,
-                                       attribute_types=attribute_types)
+    for k, v in vector.attr_def.items():
+        print('{} - {}'.format(str(k), str(v)))
 
     print(vector)
 